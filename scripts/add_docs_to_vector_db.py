@@ -4,37 +4,38 @@ Add documentation to the vector database
 """
 
 import os
+import sys
 import re
+import mmap
 import logging
-import uuid
-import json
+import orjson
 import argparse
+import traceback
 from pathlib import Path
-from datetime import datetime
-import chromadb
-from chromadb.utils import embedding_functions
+from collections import deque
+from itertools import chain, islice
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
+from chromadb.utils.batch_utils import create_batches
+from vector_db_utils import SentenceTransformerEmbedder, embed_documents, content_hash_id, find_new_ids, get_chroma_client
+from log_utils import setup_script_logging
 
-# Set up logging
-# Ensure logs directory exists
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-    
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join('logs', f'add_docs_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Compiled once: paragraph breaks and MDX frontmatter/imports
+# (the MDX patterns are bytes patterns, applied to the memory-mapped file)
+PARA_RE = re.compile(r'\n\s*\n')
+FRONTMATTER_RE = re.compile(rb'^---\n.*?---\n', re.DOTALL | re.MULTILINE)
+IMPORT_RE = re.compile(rb'^import.*?from.*?;?\n', re.MULTILINE)
+
 def ensure_directory(directory):
     """Ensure a directory exists"""
-    if not os.path.exists(directory):
+    try:
         os.makedirs(directory)
         logger.info(f"Created directory: {directory}")
+    except FileExistsError:
+        pass
 
 def load_environment():
     """Load environment variables"""
@@ -42,12 +43,12 @@ def load_environment():
     return True
 
 def process_mdx_frontmatter(content):
-    """Remove frontmatter and import statements from MDX files"""
+    """Remove frontmatter and import statements from raw MDX bytes"""
     # Remove frontmatter (between --- delimiters)
-    content = re.sub(r'^---\n.*?---\n', '', content, flags=re.DOTALL | re.MULTILINE)
+    content = FRONTMATTER_RE.sub(b'', content)
     
     # Remove import statements
-    content = re.sub(r'^import.*?from.*?;?\n', '', content, flags=re.MULTILINE)
+    content = IMPORT_RE.sub(b'', content)
     
     return content
 
@@ -79,141 +80,250 @@ def extract_metadata_from_file(file_path):
     }
 
 def get_file_content(file_path):
-    """Get the content of a file"""
+    """Get the content of a file, memory-mapped so pages are read on demand"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-            # Process MDX content
-            if str(file_path).endswith('.mdx'):
-                content = process_mdx_frontmatter(content)
+        with open(file_path, 'rb') as f:
+            # Empty files can't be memory-mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
             
-            return content
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Translate CRLF/CR newlines as text mode would; files without them are used in place
+                content = mm
+                if mm.find(b'\r') != -1:
+                    content = mm[:].replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+                
+                # Process MDX content on the raw bytes, then decode what's left
+                if str(file_path).endswith('.mdx'):
+                    return process_mdx_frontmatter(content).decode('utf-8')
+                
+                return str(content, 'utf-8')
     except Exception as e:
         logger.error(f"Error reading file {file_path}: {e}")
         return None
 
-def chunk_document_by_sections(content, metadata, min_chunk_size=150, max_chunk_size=1500):
+def split_paragraphs(text, min_chunk_size, max_chunk_size):
     """
-    Split document into chunks based on headers
-    Returns list of (chunk_text, chunk_metadata) tuples
+    Split oversized text at paragraph boundaries
+    Returns (chunks, remainder) where remainder is the trailing text that is kept
+    open for the content that follows
     """
-    # Split by headers
-    header_pattern = r'(#{1,6}\s+.*?)(?:\n|$)'
-    sections = re.split(header_pattern, content)
+    chunks = []
+    chunk_start = 0
+    chunk_end = None
+    paragraph_start = 0
     
+    # Each separator ends a paragraph; slice chunks out by position instead of rebuilding strings
+    for separator in PARA_RE.finditer(text):
+        if chunk_end is not None and separator.start() - chunk_start > max_chunk_size:
+            chunk = text[chunk_start:chunk_end].strip()
+            if len(chunk) > min_chunk_size:
+                chunks.append(chunk)
+            chunk_start = paragraph_start
+        chunk_end = separator.start()
+        paragraph_start = separator.end()
+    
+    return chunks, text[chunk_start:]
+
+def find_headers(content):
+    """
+    Yield (start, end, level, text) for each markdown header line (1-6 '#' then a space or tab)
+    Jumps between line-initial '#' characters with str.find, so body text is never scanned in Python
+    """
+    start = 0 if content.startswith('#') else content.find('\n#')
+    while start != -1:
+        if content[start] == '\n':
+            start += 1
+        
+        line_end = content.find('\n', start)
+        if line_end == -1:
+            line_end = len(content)
+        
+        line = content[start:line_end]
+        level = len(line) - len(line.lstrip('#'))
+        text = line[level:].lstrip(' \t')
+        if level <= 6 and len(text) < len(line) - level:
+            yield start, line_end, level, text
+        
+        start = content.find('\n#', line_end)
+
+def chunk_document_by_sections(content, min_chunk_size=150, max_chunk_size=1500):
+    """
+    Split document into chunks based on headers
+    A header's block (its body plus all of its sub-sections) is kept as one chunk when it fits
+    within 1.5x max_chunk_size; larger blocks emit their own body and descend into their
+    sub-headers, and only text that is still too large is split at paragraph boundaries.
+    Returns list of (chunk_text, section_metadata) tuples; section_metadata only holds
+    the per-chunk keys and is merged with the file's metadata when the chunk is stored
+    """
     chunks = []
-    current_section = "Introduction"
-    current_text = ""
-    current_headers = []
+    # Headers are semantic units, so allow a block to run over max_chunk_size before splitting it
+    block_limit = int(max_chunk_size * 1.5)
+    headers = list(find_headers(content))
+    header_starts = [header[0] for header in headers] + [len(content)]
     
-    for i, section in enumerate(sections):
-        # Skip empty sections
-        if not section.strip():
-            continue
-            
-        if re.match(r'^#{1,6}\s+', section):  # This is a header
-            # Save the previous section if it's not empty
-            if current_text and len(current_text.strip()) > min_chunk_size:
-                chunk_metadata = metadata.copy()
-                chunk_metadata['section_headers'] = current_headers.copy()
-                chunk_metadata['section'] = current_section
-                chunks.append((current_text.strip(), chunk_metadata))
-                current_text = ""
-            
-            # Update the current section header
-            header_level = len(re.match(r'^(#+)', section).group(1))
-            current_section = section.strip('# \n')
-            
-            # Update headers list (remove any at the current level or deeper)
-            current_headers = [h for h in current_headers if h['level'] < header_level]
-            current_headers.append({'level': header_level, 'text': current_section})
+    # A header's block ends at the next header of the same or a higher level
+    block_ends = [len(headers)] * len(headers)
+    open_blocks = []
+    for index, (_, _, level, _) in enumerate(headers):
+        while open_blocks and headers[open_blocks[-1]][2] >= level:
+            block_ends[open_blocks.pop()] = index
+        open_blocks.append(index)
+    
+    # Text too short to stand alone is carried into the next chunk
+    carry = ""
+    
+    def add_text(text, section, headers_json):
+        nonlocal carry
+        text = carry + text
+        if len(text) > block_limit:
+            paragraph_chunks, text = split_paragraphs(text, min_chunk_size, max_chunk_size)
+            for chunk in paragraph_chunks:
+                chunks.append((chunk, {'section_headers': headers_json, 'section': section}))
+        
+        if len(text.strip()) > min_chunk_size:
+            chunks.append((text.strip(), {'section_headers': headers_json, 'section': section}))
+            carry = ""
         else:
-            # This is content, add it to the current section
-            current_text += section
-            
-            # If the section is too large, split it further
-            if len(current_text) > max_chunk_size:
-                # Try to split at paragraph boundaries
-                paragraphs = re.split(r'\n\s*\n', current_text)
-                
-                # Build chunks from paragraphs
-                temp_chunk = ""
-                for para in paragraphs[:-1]:  # Process all but the last paragraph
-                    if len(temp_chunk) + len(para) <= max_chunk_size:
-                        temp_chunk += para + "\n\n"
-                    else:
-                        if temp_chunk and len(temp_chunk.strip()) > min_chunk_size:
-                            chunk_metadata = metadata.copy()
-                            chunk_metadata['section_headers'] = current_headers.copy()
-                            chunk_metadata['section'] = current_section
-                            chunks.append((temp_chunk.strip(), chunk_metadata))
-                        temp_chunk = para + "\n\n"
-                
-                # Keep the last paragraph and any new content for the next iteration
-                current_text = temp_chunk + paragraphs[-1]
+            carry = text
     
-    # Don't forget the last section
-    if current_text and len(current_text.strip()) > min_chunk_size:
-        chunk_metadata = metadata.copy()
-        chunk_metadata['section_headers'] = current_headers.copy()
-        chunk_metadata['section'] = current_section
-        chunks.append((current_text.strip(), chunk_metadata))
+    def add_children(first, last, parent_headers):
+        # Walk the top-level blocks between headers[first] and headers[last]
+        index = first
+        while index < last:
+            add_block(index, parent_headers)
+            index = block_ends[index]
+    
+    def add_block(index, parent_headers):
+        _, header_end, level, header_text = headers[index]
+        section = header_text.strip('# ')
+        section_headers = parent_headers + [{'level': level, 'text': section}]
+        headers_json = orjson.dumps(section_headers).decode('utf-8')
+        
+        block_end = block_ends[index]
+        if header_starts[block_end] - header_end <= block_limit:
+            add_text(content[header_end:header_starts[block_end]], section, headers_json)
+            return
+        
+        # Too large to keep whole: emit the header's own body, then each sub-section
+        add_text(content[header_end:header_starts[index + 1]], section, headers_json)
+        add_children(index + 1, block_end, section_headers)
+    
+    # Text before the first header, then every top-level block
+    add_text(content[:header_starts[0]], "Introduction", "[]")
+    add_children(0, len(headers), [])
     
     return chunks
 
-def process_documentation_directory(docs_dir, min_chunk_size=150, max_chunk_size=1500):
+def process_documentation_file(file_path, min_chunk_size=150, max_chunk_size=1500):
+    """
+    Read and chunk a single documentation file
+    Returns (file_metadata, chunks, error); runs in a worker process, so errors are
+    returned as a formatted traceback for the parent to log
+    """
+    try:
+        # Get file content
+        content = get_file_content(file_path)
+        if not content:
+            return None, None, None
+        
+        # Extract metadata
+        metadata = extract_metadata_from_file(file_path)
+        
+        # Chunk the document
+        chunks = chunk_document_by_sections(
+            content, 
+            min_chunk_size=min_chunk_size,
+            max_chunk_size=max_chunk_size
+        )
+        return metadata, chunks, None
+    
+    except Exception:
+        return None, None, traceback.format_exc()
+
+def parse_files_in_pool(process_file, doc_files, workers):
     """
-    Process all documentation files in a directory and return chunks
+    Yield (file_path, result) for each file in order, parsing across worker processes
+    Only a few files are in flight at a time, so results stream out while later files are still parsing
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        remaining_files = iter(doc_files)
+        pending = deque(
+            (file_path, executor.submit(process_file, file_path))
+            for file_path in islice(remaining_files, workers * 2)
+        )
+        
+        while pending:
+            file_path, future = pending.popleft()
+            
+            # Top up the in-flight window before waiting on the oldest file
+            next_file = next(remaining_files, None)
+            if next_file is not None:
+                pending.append((next_file, executor.submit(process_file, next_file)))
+            
+            yield file_path, future.result()
+
+def process_documentation_directory(docs_dir, min_chunk_size=150, max_chunk_size=1500, workers=None):
+    """
+    Process all documentation files in a directory and yield
+    (chunk_text, file_metadata, section_metadata) tuples
+    Files are parsed in parallel across worker processes (default: one per CPU), with only a
+    few files in flight at a time so chunks stream out while later files are still parsing;
+    with a single worker they are parsed in this process
     """
     logger.info(f"Processing documentation files in: {docs_dir}")
     
-    all_chunks = []
+    chunk_count = 0
     file_count = 0
     
-    # Get all .md and .mdx files
-    doc_files = list(Path(docs_dir).glob('**/*.md')) + list(Path(docs_dir).glob('**/*.mdx'))
+    # Get all .md and .mdx files in a single walk of the directory tree
+    doc_files = [
+        Path(root, filename)
+        for root, _, filenames in os.walk(docs_dir)
+        for filename in filenames
+        if filename.endswith(('.md', '.mdx'))
+    ]
     
     if not doc_files:
         logger.warning(f"No .md or .mdx files found in {docs_dir}")
-        return all_chunks
+        return
     
     logger.info(f"Found {len(doc_files)} documentation files")
     
-    # Process each file
-    for file_path in doc_files:
-        try:
-            # Get file content
-            content = get_file_content(file_path)
-            if not content:
-                continue
-                
-            # Extract metadata
-            metadata = extract_metadata_from_file(file_path)
-            
-            # Chunk the document
-            chunks = chunk_document_by_sections(
-                content, 
-                metadata,
-                min_chunk_size=min_chunk_size,
-                max_chunk_size=max_chunk_size
-            )
-            
-            # Add to the result
-            all_chunks.extend(chunks)
-            file_count += 1
-            
-            logger.info(f"Processed {file_path.name}: generated {len(chunks)} chunks")
-            
-        except Exception as e:
-            logger.error(f"Error processing {file_path}: {e}", exc_info=True)
+    process_file = partial(
+        process_documentation_file,
+        min_chunk_size=min_chunk_size,
+        max_chunk_size=max_chunk_size
+    )
+    workers = min(workers or os.cpu_count() or 1, len(doc_files))
     
-    logger.info(f"Processed {file_count} files and generated {len(all_chunks)} total chunks")
-    return all_chunks
+    # A single worker parses in this process, which also avoids forking while other threads are running
+    if workers == 1:
+        results = ((file_path, process_file(file_path)) for file_path in doc_files)
+    else:
+        results = parse_files_in_pool(process_file, doc_files, workers)
+    
+    # Process each file, logging from the parent as results come back in order
+    for file_path, (metadata, chunks, error) in results:
+        if error:
+            logger.error(f"Error processing {file_path}:\n{error}")
+            continue
+        if chunks is None:
+            continue
+        
+        file_count += 1
+        chunk_count += len(chunks)
+        logger.info(f"Processed {file_path.name}: generated {len(chunks)} chunks")
+        for text, section_metadata in chunks:
+            yield text, metadata, section_metadata
+    
+    logger.info(f"Processed {file_count} files and generated {chunk_count} total chunks")
 
-def add_to_vector_database(chunks, db_path=None, collection_name=None, force_rebuild=False):
+def add_to_vector_database(chunks, db_path=None, collection_name=None, force_rebuild=False, batch_size=250,
+                           chroma_server=None):
     """
     Add chunks to vector database
+    Accepts any iterable of (chunk_text, file_metadata, section_metadata), consumed one batch at a time
     """
     # Load environment
     load_environment()
@@ -230,13 +340,10 @@ def add_to_vector_database(chunks, db_path=None, collection_name=None, force_reb
         embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
         logger.info(f"Initializing embedding model: {embedding_model}")
         
-        embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model
-        )
+        embedding_function = SentenceTransformerEmbedder(embedding_model)
         
         # Connect to the vector database
-        logger.info(f"Connecting to vector database at: {db_path}")
-        client = chromadb.PersistentClient(path=db_path)
+        client = get_chroma_client(db_path, chroma_server)
         
         # Check if collection exists and handle force_rebuild
         try:
@@ -266,49 +373,71 @@ def add_to_vector_database(chunks, db_path=None, collection_name=None, force_reb
             )
             logger.info(f"Created new collection: {collection_name}")
         
-        # Prepare data for adding to the collection
-        documents = []
-        metadatas = []
-        ids = []
-        
-        for i, (text, metadata) in enumerate(chunks):
-            # Generate a unique ID
-            doc_id = f"doc_{uuid.uuid4().hex}"
-            
-            # Fix metadata - convert non-string values so Chroma doesn't complain
-            json_safe_metadata = {}
-            for k, v in metadata.items():
-                if isinstance(v, (str, int, float, bool)) or v is None:
-                    json_safe_metadata[k] = v
-                else:
-                    # Convert complex objects to strings
-                    json_safe_metadata[k] = json.dumps(v)
-            
-            documents.append(text)
-            metadatas.append(json_safe_metadata)
-            ids.append(doc_id)
+        def insert(batches):
+            for batch in batches:
+                collection.upsert(*batch)
         
-        # Add in batches to avoid memory issues
-        batch_size = 100
-        for i in range(0, len(documents), batch_size):
-            end = min(i + batch_size, len(documents))
-            logger.info(f"Adding batch {i//batch_size + 1}/{(len(documents) + batch_size - 1)//batch_size}: items {i} to {end-1}")
+        # Chunks stream in from the parser; each batch is embedded here while the
+        # previous one is still being inserted on the writer thread
+        chunks = iter(chunks)
+        added_count = 0
+        skipped_count = 0
+        pending_insert = None
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            while True:
+                batch = list(islice(chunks, batch_size))
+                if not batch:
+                    break
+                
+                # IDs hash the file path and text, so chunks already stored are skipped, not re-embedded
+                ids = [content_hash_id(f"{file_metadata['path']}\0{text}", prefix="doc_")
+                       for text, file_metadata, _ in batch]
+                new_positions = find_new_ids(collection, ids, client.get_max_batch_size())
+                skipped_count += len(batch) - len(new_positions)
+                if not new_positions:
+                    continue
+                
+                # Prepare data for adding to the collection
+                documents = []
+                metadatas = []
+                ids = [ids[i] for i in new_positions]
+                
+                for i in new_positions:
+                    # Metadata values are already Chroma-safe; section_headers is serialized by the chunker
+                    text, file_metadata, section_metadata = batch[i]
+                    documents.append(text)
+                    metadatas.append({**file_metadata, **section_metadata})
+                
+                embeddings = embed_documents(embedding_function.model, documents, show_progress_bar=False)
+                
+                if pending_insert:
+                    pending_insert.result()
+                
+                logger.info(f"Adding batch: items {added_count} to {added_count + len(ids) - 1}")
+                # create_batches splits the insert if it exceeds what Chroma accepts per call
+                pending_insert = writer.submit(insert, create_batches(
+                    client,
+                    ids=ids,
+                    embeddings=embeddings.tolist(),
+                    metadatas=metadatas,
+                    documents=documents
+                ))
+                added_count += len(ids)
             
-            collection.add(
-                documents=documents[i:end],
-                metadatas=metadatas[i:end],
-                ids=ids[i:end]
-            )
+            if pending_insert:
+                pending_insert.result()
         
-        logger.info(f"Successfully added {len(documents)} chunks to collection {collection_name}")
+        if skipped_count:
+            logger.info(f"Skipped {skipped_count} chunks already in collection {collection_name}")
+        logger.info(f"Successfully added {added_count} chunks to collection {collection_name}")
         return True
         
     except Exception as e:
         logger.error(f"Error adding to vector database: {e}", exc_info=True)
         return False
 
-def main():
-    """Process documentation and add to vector database"""
+def main(argv=None):
+    """Process documentation and add to vector database, returning True on success"""
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Add documentation to vector database")
     parser.add_argument('--docs-dir', type=str, default="docs", 
@@ -321,7 +450,14 @@ def main():
                         help="Maximum chunk size in characters (default: 1500)")
     parser.add_argument('--force', action='store_true',
                         help="Force rebuild if collection already exists")
-    args = parser.parse_args()
+    parser.add_argument('--batch-size', type=int, default=250,
+                        help="Number of chunks embedded and inserted per batch (default: 250)")
+    parser.add_argument('--workers', type=int,
+                        help="Number of processes used to parse files (default: one per CPU)")
+    parser.add_argument('--chroma-server', type=str,
+                        help="URL of a Chroma server to use instead of the local database (e.g. http://localhost:8000)")
+    args = parser.parse_args(argv)
+    setup_script_logging(logger, "add_docs")
     
     # Create necessary directories
     ensure_directory("logs")
@@ -330,29 +466,36 @@ def main():
     docs_dir = args.docs_dir
     if not os.path.exists(docs_dir):
         logger.error(f"Documentation directory '{docs_dir}' not found.")
-        return
+        return False
     
     # Process documentation files
     chunks = process_documentation_directory(
         docs_dir, 
         min_chunk_size=args.min_chunk,
-        max_chunk_size=args.max_chunk
+        max_chunk_size=args.max_chunk,
+        workers=args.workers
     )
     
-    if not chunks:
+    # Peek at the first chunk so an empty corpus fails before connecting to the database
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
         logger.error("No chunks generated from documentation files")
-        return
+        return False
+    chunks = chain([first_chunk], chunks)
     
     # Add to vector database
-    if add_to_vector_database(chunks, collection_name=args.collection, force_rebuild=args.force):
+    if add_to_vector_database(chunks, collection_name=args.collection, force_rebuild=args.force,
+                              batch_size=args.batch_size, chroma_server=args.chroma_server):
         logger.info("Successfully added documentation to vector database")
         print("\nDocumentation successfully added to vector database!")
         print("You can now use it in your queries.")
+        return True
     else:
         logger.error("Failed to add documentation to vector database")
         print("\nFailed to add documentation to vector database")
+        return False
 
 if __name__ == "__main__":
     print("Adding Documentation to Vector Database")
     print("======================================")
-    main()
\ No newline at end of file
+    sys.exit(0 if main() else 1)
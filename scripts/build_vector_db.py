@@ -4,40 +4,40 @@ Build a vector database from chat message CSV data
 """
 
 import os
-import uuid
+import sys
 import logging
 import argparse
 import pandas as pd
-import chromadb
-from chromadb.utils import embedding_functions
 from tqdm import tqdm
 from dotenv import load_dotenv
+from chromadb.utils.batch_utils import create_batches
+from vector_db_utils import SentenceTransformerEmbedder, embed_documents, content_hash_id, find_new_ids, get_chroma_client
+from log_utils import setup_script_logging
 
-# Set up logging
-# Ensure logs directory exists
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-    
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join('logs', f'build_db_{pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")}.log')),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Columns used to build the chat collection; any others in the CSV are not parsed
+CSV_COLUMNS = {"timestamp", "username", "message", "topic"}
+
 def ensure_directory(directory):
     """Ensure a directory exists"""
-    if not os.path.exists(directory):
+    try:
         os.makedirs(directory)
         logger.info(f"Created directory: {directory}")
+    except FileExistsError:
+        pass
 
 def load_csv_data(file_path):
     """Load and validate CSV data"""
     try:
-        df = pd.read_csv(file_path)
+        # Read every used column as text up front so pandas skips type inference,
+        # keeping empty cells as "" rather than NaN
+        df = pd.read_csv(
+            file_path,
+            usecols=lambda column: column in CSV_COLUMNS,
+            dtype=str,
+            keep_default_na=False
+        )
         required_columns = ["timestamp", "username", "message"]
         missing_columns = [col for col in required_columns if col not in df.columns]
         
@@ -51,7 +51,8 @@ def load_csv_data(file_path):
         logger.error(f"Error loading CSV file: {e}")
         return None
 
-def build_vector_database(csv_file=None, collection_name=None, force_rebuild=False):
+def build_vector_database(csv_file=None, collection_name=None, force_rebuild=False, batch_size=250,
+                          chroma_server=None):
     """Build a vector database from chat CSV data"""
     # Load environment variables
     load_dotenv()
@@ -69,7 +70,8 @@ def build_vector_database(csv_file=None, collection_name=None, force_rebuild=Fal
     
     # Create necessary directories
     ensure_directory("logs")
-    ensure_directory(db_path)
+    if not chroma_server:
+        ensure_directory(db_path)
     
     # Check if CSV file exists
     if not os.path.exists(csv_file):
@@ -84,13 +86,10 @@ def build_vector_database(csv_file=None, collection_name=None, force_rebuild=Fal
     try:
         # Set up the embedding function (using Sentence Transformers locally)
         logger.info(f"Initializing embedding model: {embedding_model}")
-        embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model
-        )
+        embedding_function = SentenceTransformerEmbedder(embedding_model)
         
-        # Initialize the persistent vector database
-        logger.info(f"Initializing vector database at: {db_path}")
-        client = chromadb.PersistentClient(path=db_path)
+        # Initialize the vector database (local, or a Chroma server if one was given)
+        client = get_chroma_client(db_path, chroma_server)
         
         # Create or get collection
         collection = client.get_or_create_collection(
@@ -126,44 +125,51 @@ def build_vector_database(csv_file=None, collection_name=None, force_rebuild=Fal
         
         # Prepare data for ingestion
         logger.info("Preparing data for vectorization...")
-        ids = []
-        documents = []
-        metadatas = []
+        timestamps = df["timestamp"].astype(str)
+        usernames = df["username"].astype(str)
+        messages = df["message"].astype(str)
+        topics = df["topic"].astype(str) if "topic" in df.columns else ""
         
-        for _, row in tqdm(df.iterrows(), total=len(df), desc="Processing messages"):
-            # Create a unique ID
-            doc_id = str(uuid.uuid4())
-            ids.append(doc_id)
-            
-            # Format the message
-            document = f"[{row['timestamp']}] {row['username']}: {row['message']}"
-            documents.append(document)
-            
-            # Add metadata
-            metadata = {
-                "timestamp": str(row.get("timestamp", "")),
-                "username": str(row.get("username", "")),
-                "topic": str(row.get("topic", "")),
-                "source_type": "chat"  # Mark as chat for combined queries
-            }
-            metadatas.append(metadata)
+        # Format the messages with column-wise string operations rather than row by row
+        documents = ("[" + timestamps + "] " + usernames + ": " + messages).tolist()
+        
+        # Add metadata
+        metadatas = pd.DataFrame({
+            "timestamp": timestamps,
+            "username": usernames,
+            "topic": topics,
+            "source_type": "chat"  # Mark as chat for combined queries
+        }).to_dict("records")
+        
+        # IDs are content hashes, so messages already in the collection are skipped, not re-embedded;
+        # the occurrence number keeps genuinely repeated rows (same time, user and text) as separate records
+        occurrences = {}
+        ids = []
+        for document in documents:
+            n = occurrences[document] = occurrences.get(document, -1) + 1
+            ids.append(content_hash_id(f"{document}\0{n}"))
+        new_positions = find_new_ids(collection, ids, client.get_max_batch_size())
+        if len(new_positions) < len(ids):
+            logger.info(f"Skipping {len(ids) - len(new_positions)} messages already in the collection")
+            ids = [ids[i] for i in new_positions]
+            documents = [documents[i] for i in new_positions]
+            metadatas = [metadatas[i] for i in new_positions]
         
-        # Add data to the collection (in batches if needed)
-        batch_size = 100  # Adjust based on your memory constraints
-        total_batches = (len(documents) + batch_size - 1) // batch_size
+        if not documents:
+            logger.info(f"No new messages to add, collection has {collection.count()} documents")
+            return True
         
-        logger.info(f"Adding {len(documents)} documents to vector database in {total_batches} batches...")
-        for i in tqdm(range(0, len(documents), batch_size), desc="Adding to vector database"):
-            end_idx = min(i + batch_size, len(documents))
-            batch_ids = ids[i:end_idx]
-            batch_documents = documents[i:end_idx]
-            batch_metadatas = metadatas[i:end_idx]
+        # Embed outside of Chroma one batch at a time, so only one batch of vectors is held as Python lists
+        logger.info(f"Adding {len(documents)} documents to vector database in batches of {batch_size}...")
+        for start in tqdm(range(0, len(documents), batch_size), desc="Adding to vector database"):
+            end = start + batch_size
+            embeddings = embed_documents(embedding_function.model, documents[start:end], batch_size=batch_size,
+                                         show_progress_bar=False)
             
-            collection.add(
-                ids=batch_ids,
-                documents=batch_documents,
-                metadatas=batch_metadatas
-            )
+            # create_batches splits the insert if it exceeds what Chroma accepts per call
+            for batch in create_batches(client, ids=ids[start:end], embeddings=embeddings.tolist(),
+                                        metadatas=metadatas[start:end], documents=documents[start:end]):
+                collection.upsert(*batch)
         
         # Verify the database was created successfully
         final_count = collection.count()
@@ -174,20 +180,25 @@ def build_vector_database(csv_file=None, collection_name=None, force_rebuild=Fal
         logger.error(f"Error building vector database: {e}", exc_info=True)
         return False
 
-def main():
-    """Parse command-line arguments and build the vector database"""
+def main(argv=None):
+    """Parse command-line arguments (argv, or sys.argv when None) and build the vector database"""
     parser = argparse.ArgumentParser(description="Build a vector database from chat message CSV data")
     parser.add_argument('--csv', type=str, help="Path to CSV file containing chat messages")
     parser.add_argument('--collection', type=str, help="Name for the vector database collection")
     parser.add_argument('--force', action='store_true', help="Force rebuild if collection already exists")
-    args = parser.parse_args()
+    parser.add_argument('--batch-size', type=int, default=250, help="Number of messages embedded and inserted per batch (default: 250)")
+    parser.add_argument('--chroma-server', type=str, help="URL of a Chroma server to use instead of the local database (e.g. http://localhost:8000)")
+    args = parser.parse_args(argv)
+    setup_script_logging(logger, "build_db")
     
-    if build_vector_database(args.csv, args.collection, args.force):
+    if build_vector_database(args.csv, args.collection, args.force, args.batch_size, args.chroma_server):
         print("\nVector database built successfully!")
         print("You can now add documentation with add_docs_to_vector_db.py")
         print("or run analysis with toolkit.py or multi_llm_combined_analyzer.py")
+        return True
     else:
         print("\nFailed to build vector database. Check the logs for details.")
+        return False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(0 if main() else 1)
@@ -9,11 +9,8 @@ issues with the setup before running the full pipeline.
 
 import os
 import sys
-import importlib
-import subprocess
-import unittest
-import tempfile
-import json
+import importlib.util
+import importlib.metadata
 from pathlib import Path
 
 # ANSI color codes for terminal output
@@ -23,6 +20,21 @@ YELLOW = "\033[0;33m"
 BLUE = "\033[0;34m"
 NC = "\033[0m"  # No color
 
+# Files checked relative to the project root
+ENV_PATH = Path(".env")
+ENV_EXAMPLE_PATH = Path(".env.example")
+SAMPLE_FILES = {
+    "Chat Data": Path("data/chat_data.csv"),
+    "Sample Markdown": Path("sample-markdown-file.md"),
+    "Documentation": Path("docs/monitoring-dashboard.md")
+}
+
+# Set once ensure_env_loaded has read the .env file
+_ENV_LOADED = False
+
+# Installed versions found by find_package, keyed by import name
+_PACKAGE_CACHE = {}
+
 def print_header(text):
     """Print a section header"""
     print(f"\n{BLUE}{'=' * 70}{NC}")
@@ -30,8 +42,12 @@ def print_header(text):
     print(f"{BLUE}{'=' * 70}{NC}")
 
 def print_result(name, success, message=None):
-    """Print a test result with appropriate color"""
-    if success:
+    """Print a test result with appropriate color; success=None marks a skipped test"""
+    if success is None:
+        print(f"{YELLOW}- {name}: SKIP{NC}")
+        if message:
+            print(f"  {message}")
+    elif success:
         print(f"{GREEN}✓ {name}: PASS{NC}")
     else:
         print(f"{RED}✗ {name}: FAIL{NC}")
@@ -51,12 +67,40 @@ def check_python_version():
                    f"Required: 3.9 or higher, Found: {sys.version.split()[0]}")
         return False
 
+def find_package(package_name, import_name):
+    """
+    Return the installed version of a package ("Unknown" if it isn't recorded), or None if it's missing
+    Packages are only located, not imported; importing heavy packages like
+    sentence_transformers would take seconds. Results are cached for repeated checks.
+    """
+    if import_name in _PACKAGE_CACHE:
+        return _PACKAGE_CACHE[import_name]
+    
+    # A module that's already imported is installed; otherwise search for it
+    found = import_name in sys.modules
+    if not found:
+        try:
+            found = importlib.util.find_spec(import_name) is not None
+        except ModuleNotFoundError:
+            found = False
+    
+    version = None
+    if found:
+        try:
+            version = importlib.metadata.version(package_name)
+        except importlib.metadata.PackageNotFoundError:
+            version = "Unknown"
+    
+    _PACKAGE_CACHE[import_name] = version
+    return version
+
 def check_dependencies():
     """Check if all required packages are installed"""
     required_packages = {
         "pandas": "pandas",
         "python-dotenv": "dotenv",
         "tqdm": "tqdm",
+        "orjson": "orjson",
         "chromadb": "chromadb",
         "sentence-transformers": "sentence_transformers",
         "anthropic": "anthropic",
@@ -69,27 +113,32 @@ def check_dependencies():
     all_installed = True
     
     for package_name, import_name in required_packages.items():
-        try:
-            module = importlib.import_module(import_name)
-            if hasattr(module, '__version__'):
-                version = module.__version__
-            else:
-                version = "Unknown"
-            print_result(f"{package_name} ({version})", True)
-        except ImportError as e:
+        version = find_package(package_name, import_name)
+        if version is None:
             all_installed = False
-            print_result(package_name, False, str(e))
+            print_result(package_name, False, f"No module named '{import_name}'")
+        else:
+            print_result(f"{package_name} ({version})", True)
     
     return all_installed
 
+def list_directory(path, dirs=False):
+    """Return the names of the files (or subdirectories, with dirs=True) in path, empty if it doesn't exist"""
+    try:
+        with os.scandir(path) as entries:
+            if dirs:
+                return {entry.name for entry in entries if entry.is_dir()}
+            return {entry.name for entry in entries if entry.is_file()}
+    except OSError:
+        return set()
+
 def check_directory_structure():
     """Check if the project directory structure is valid"""
     required_dirs = ["data", "docs", "prompts", "scripts", "tests", "outputs", "vector_db", "logs"]
-    missing_dirs = []
     
-    for dir_name in required_dirs:
-        if not os.path.isdir(dir_name):
-            missing_dirs.append(dir_name)
+    # One directory read instead of a stat per required directory
+    present_dirs = list_directory(".", dirs=True)
+    missing_dirs = [dir_name for dir_name in required_dirs if dir_name not in present_dirs]
     
     if not missing_dirs:
         print_result("Directory Structure", True)
@@ -101,10 +150,10 @@ def check_directory_structure():
 
 def check_env_file():
     """Check if .env file exists or can be created from template"""
-    if os.path.exists(".env"):
+    if ENV_PATH.is_file():
         print_result("Environment File", True)
         return True
-    elif os.path.exists(".env.example"):
+    elif ENV_EXAMPLE_PATH.is_file():
         print(f"{YELLOW}Warning: .env file not found, but .env.example exists.{NC}")
         print(f"{YELLOW}Run 'cp .env.example .env' and add your API keys.{NC}")
         return True
@@ -115,16 +164,15 @@ def check_env_file():
 
 def check_sample_data():
     """Check if sample data files exist"""
-    sample_files = {
-        "Chat Data": "data/chat_data.csv",
-        "Sample Markdown": "sample-markdown-file.md",
-        "Documentation": "docs/monitoring-dashboard.md"
-    }
-    
     all_exist = True
     
-    for name, path in sample_files.items():
-        if os.path.exists(path):
+    # Read each parent directory once and check the files against its listing
+    listings = {}
+    for name, path in SAMPLE_FILES.items():
+        if path.parent not in listings:
+            listings[path.parent] = list_directory(path.parent)
+        
+        if path.name in listings[path.parent]:
             print_result(f"Sample {name}", True)
         else:
             all_exist = False
@@ -134,6 +182,7 @@ def check_sample_data():
 
 def create_test_files():
     """Create temporary test files for validation"""
+    import tempfile
     temp_dir = tempfile.gettempdir()
     
     # Create a simple markdown test file
@@ -158,29 +207,30 @@ def clean_test_files(files):
 
 def check_md_to_csv_conversion(test_files):
     """Test the markdown to CSV conversion functionality"""
+    import io
+    import tempfile
+    import contextlib
     md_file = test_files["md_file"]
     output_csv = os.path.join(tempfile.gettempdir(), "test_output.csv")
     
+    # Call the converter in-process rather than starting another interpreter,
+    # keeping its progress output out of the validation report
     try:
-        result = subprocess.run(
-            [sys.executable, "scripts/md_to_csv_converter.py", "--input", md_file, "--output", output_csv],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        
-        if os.path.exists(output_csv):
-            # Clean up the output file
-            os.remove(output_csv)
-            print_result("Markdown to CSV Conversion", True)
-            return True
-        else:
-            print_result("Markdown to CSV Conversion", False, "Output file not created")
-            return False
-            
-    except subprocess.CalledProcessError as e:
+        from md_to_csv_converter import convert_markdown_to_csv
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert_markdown_to_csv(md_file, output_csv, track_source=False)
+    except Exception as e:
         print_result("Markdown to CSV Conversion", False, 
-                   f"Command failed with error: {e.stderr}")
+                   f"Conversion failed with error: {e}")
+        return False
+    
+    if os.path.exists(output_csv):
+        # Clean up the output file
+        os.remove(output_csv)
+        print_result("Markdown to CSV Conversion", True)
+        return True
+    else:
+        print_result("Markdown to CSV Conversion", False, "Output file not created")
         return False
 
 def check_toolkit_module():
@@ -195,18 +245,43 @@ def check_toolkit_module():
 
 def check_test_suite():
     """Check if the test suite runs without errors"""
+    test_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+    
+    # With pytest-xdist installed, shard the tests across worker processes
+    # (PYTEST_WORKERS pins the worker count, e.g. on CPU-limited CI)
+    if find_package("pytest-xdist", "xdist"):
+        import subprocess
+        workers = os.environ.get("PYTEST_WORKERS", "auto")
+        result = subprocess.run(
+            [sys.executable, "-m", "pytest", "-n", workers, "-q", test_dir],
+            capture_output=True,
+            text=True
+        )
+        
+        if result.returncode == 0:
+            print_result("Test Suite", True)
+            return True
+        else:
+            summary = result.stdout.strip().splitlines()[-1:] or [result.stderr.strip()]
+            print_result("Test Suite", False, summary[0])
+            return False
+    
+    import io
+    import unittest
     try:
         loader = unittest.TestLoader()
-        test_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
         suite = loader.discover(test_dir, pattern="test_*.py")
         
-        runner = unittest.TextTestRunner(verbosity=0)
+        # Buffer the runner's output and only show it if something failed
+        output = io.StringIO()
+        runner = unittest.TextTestRunner(stream=output, verbosity=0)
         result = runner.run(suite)
         
         if result.wasSuccessful():
             print_result("Test Suite", True)
             return True
         else:
+            print(output.getvalue(), file=sys.stderr)
             print_result("Test Suite", False, 
                        f"Failed tests: {len(result.failures)}, Errors: {len(result.errors)}")
             return False
@@ -214,35 +289,46 @@ def check_test_suite():
         print_result("Test Suite", False, str(e))
         return False
 
-def check_api_keys():
-    """Check if any API keys are configured"""
-    # Try to load .env file
+def ensure_env_loaded():
+    """Load the .env file once per process; returns False if python-dotenv isn't available"""
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return True
+    
     try:
         from dotenv import load_dotenv
-        load_dotenv()
-        
-        api_keys = {
-            "OpenAI": os.getenv("OPENAI_API_KEY"),
-            "Anthropic": os.getenv("ANTHROPIC_API_KEY"),
-            "Gemini": os.getenv("GEMINI_API_KEY")
-        }
-        
-        valid_keys = {name: (key and not key.startswith("your_")) 
-                     for name, key in api_keys.items()}
-        
-        if any(valid_keys.values()):
-            valid_providers = [name for name, is_valid in valid_keys.items() if is_valid]
-            print_result("API Keys", True, 
-                       f"Found valid keys for: {', '.join(valid_providers)}")
-            return True
-        else:
-            print_result("API Keys", False, 
-                       "No valid API keys found. Add at least one key to .env file.")
-            return False
-            
     except ImportError:
+        return False
+    
+    load_dotenv()
+    _ENV_LOADED = True
+    return True
+
+def check_api_keys():
+    """Check if any API keys are configured"""
+    # Try to load .env file
+    if not ensure_env_loaded():
         print_result("API Keys", False, "Could not load dotenv module")
         return False
+    
+    api_keys = {
+        "OpenAI": os.environ.get("OPENAI_API_KEY"),
+        "Anthropic": os.environ.get("ANTHROPIC_API_KEY"),
+        "Gemini": os.environ.get("GEMINI_API_KEY")
+    }
+    
+    valid_keys = {name: (key and not key.startswith("your_")) 
+                 for name, key in api_keys.items()}
+    
+    if any(valid_keys.values()):
+        valid_providers = [name for name, is_valid in valid_keys.items() if is_valid]
+        print_result("API Keys", True, 
+                   f"Found valid keys for: {', '.join(valid_providers)}")
+        return True
+    else:
+        print_result("API Keys", False, 
+                   "No valid API keys found. Add at least one key to .env file.")
+        return False
 
 def run_validation_tests():
     """Run all validation tests and return overall success status"""
@@ -251,6 +337,22 @@ def run_validation_tests():
     # Track validation status
     validation_results = {}
     
+    # Checks that can't pass when an earlier check failed, so they are skipped instead of run
+    prerequisites = {
+        "toolkit_module": ["dependencies"],
+        "test_suite": ["dependencies"],
+    }
+    
+    def run_check(name, check, *args):
+        failed = [prerequisite for prerequisite in prerequisites.get(name, [])
+                  if not validation_results.get(prerequisite)]
+        if failed:
+            formatted_name = " ".join(word.capitalize() for word in name.split("_"))
+            print_result(formatted_name, None, f"Prerequisite {failed[0]} failed")
+            validation_results[name] = None
+        else:
+            validation_results[name] = check(*args)
+    
     # Basic environment checks
     validation_results["python_version"] = check_python_version()
     validation_results["dependencies"] = check_dependencies()
@@ -262,10 +364,10 @@ def run_validation_tests():
     test_files = create_test_files()
     
     # Functional tests
-    validation_results["toolkit_module"] = check_toolkit_module()
-    validation_results["md_to_csv"] = check_md_to_csv_conversion(test_files)
-    validation_results["test_suite"] = check_test_suite()
-    validation_results["api_keys"] = check_api_keys()
+    run_check("toolkit_module", check_toolkit_module)
+    run_check("md_to_csv", check_md_to_csv_conversion, test_files)
+    run_check("test_suite", check_test_suite)
+    run_check("api_keys", check_api_keys)
     
     # Clean up test files
     clean_test_files(test_files)
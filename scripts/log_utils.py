@@ -0,0 +1,39 @@
+"""
+Shared logging setup for the pipeline scripts
+
+Each script logs to its own file in logs/. Run on its own, a script configures the root
+logger as usual; when toolkit.py or run_demo.py import it and call its main(), the file is
+attached to the script's logger instead, since logging.basicConfig only takes effect once
+per process.
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Names of the loggers that already have their file, so repeated main() calls don't add more
+_CONFIGURED = set()
+_CONFIGURED_LOCK = threading.Lock()
+
+def setup_script_logging(logger, prefix):
+    """Send a script's log records to logs/<prefix>_<timestamp>.log and the console"""
+    with _CONFIGURED_LOCK:
+        if logger.name in _CONFIGURED:
+            return
+        _CONFIGURED.add(logger.name)
+
+    os.makedirs('logs', exist_ok=True)
+    file_handler = logging.FileHandler(os.path.join('logs', f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'))
+
+    if logger.name == "__main__":
+        logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, handlers=[file_handler, logging.StreamHandler()])
+        return
+
+    # Imported in-process: keep the caller's handlers (adding a console one if it has none),
+    # so records reach both the caller's log and this script's own file
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, handlers=[logging.StreamHandler()])
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(file_handler)
@@ -18,208 +18,347 @@ import csv
 import re
 import os
 import sys
+import heapq
 import argparse
-from datetime import datetime
+from datetime import datetime, date
+from itertools import chain, count, islice
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def parse_timestamp(timestamp_str):
-    """Try different timestamp formats."""
-    formats = [
-        ('%m/%d/%y, %I:%M %p', '%Y-%m-%d %H:%M:%S'),  # "2/25/25, 11:35 AM"
-        ('%m/%d/%y at %I:%M %p', '%Y-%m-%d %H:%M:%S'),  # "3/20/25 at 10:41 PM"
-        ('%I:%M %p', '%H:%M:%S')  # "2:28 AM" (no date, use current)
-    ]
+# Separates the username from the timestamp on a record's first line
+EM_DASH_SEP = ' — '
+
+# Supported timestamp formats as (input format, output format) pairs
+TIMESTAMP_FORMATS = (
+    ('%m/%d/%y, %I:%M %p', '%Y-%m-%d %H:%M:%S'),  # "2/25/25, 11:35 AM"
+    ('%m/%d/%y at %I:%M %p', '%Y-%m-%d %H:%M:%S'),  # "3/20/25 at 10:41 PM"
+    ('%I:%M %p', '%Y-%m-%d %H:%M:%S')  # "2:28 AM" (no date, use today's)
+)
+
+# Date used for time-only timestamps, fixed once per run
+PLACEHOLDER_DATE = date.today()
+
+# The supported formats as one pattern: an optional "M/D/YY, " or "M/D/YY at " date, then "H:MM AM"
+TIMESTAMP_RE = re.compile(r'(?:(\d{1,2})/(\d{1,2})/(\d{2})(?:, | at ))?(\d{1,2}):(\d{2}) ([AaPp])[Mm]')
+
+# Characters that make csv.writer quote a field, and the line ending it writes
+CSV_SPECIAL_RE = re.compile(r'[,"\r\n]')
+CSV_LINE_TERMINATOR = '\r\n'
+
+# Write buffer for the output CSV, so large conversions reach the disk in a few big writes
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Unquoted rows are joined and written this many at a time
+WRITE_BATCH_SIZE = 1024
+
+# Parsed timestamps by input string; chat exports repeat timestamps heavily, and
+# worker processes keep their cache across all the files they parse
+_TIMESTAMP_CACHE = {}
+TIMESTAMP_CACHE_SIZE = 100_000
+
+# Multi-file conversions parse files in worker processes from this many files on
+MIN_PARALLEL_FILES = 4
+
+def fast_parse_timestamp(timestamp_str):
+    """
+    Parse a timestamp in one of the supported formats without strptime.
+    Returns None if the string doesn't match, leaving strptime to decide.
+    """
+    match = TIMESTAMP_RE.fullmatch(timestamp_str)
+    if match is None:
+        return None
+    month, day, year, hour, minute, meridiem = match.groups()
+    
+    hour = int(hour)
+    minute = int(minute)
+    if not (1 <= hour <= 12 and minute < 60):
+        return None
+    hour = hour % 12 + (12 if meridiem in 'Pp' else 0)
+    
+    if year is None:
+        timestamp_date = PLACEHOLDER_DATE
+    else:
+        # Two-digit years follow strptime's %y: 69-99 are 1900s, 0-68 are 2000s
+        year = int(year)
+        year += 1900 if year >= 69 else 2000
+        try:
+            timestamp_date = date(year, int(month), int(day))
+        except ValueError:
+            return None
+    return f"{timestamp_date.isoformat()} {hour:02d}:{minute:02d}:00"
+
+def strptime_timestamp(timestamp_str):
+    """Try different timestamp formats with strptime."""
+    # The formats can be told apart by their content, so the first strptime call
+    # normally succeeds; the others are only tried as a fallback
+    if ' at ' in timestamp_str:
+        first_index = 1
+    elif '/' in timestamp_str:
+        first_index = 0
+    else:
+        first_index = 2
     
-    for input_format, output_format in formats:
+    for offset in range(len(TIMESTAMP_FORMATS)):
+        index = (first_index + offset) % len(TIMESTAMP_FORMATS)
+        input_format, output_format = TIMESTAMP_FORMATS[index]
         try:
             # For timestamps with no date, we'll use a placeholder date
             if input_format == '%I:%M %p':
-                # Parse just the time
+                # Parse just the time and combine it with today's date
                 time_only = datetime.strptime(timestamp_str, input_format)
-                # Use current date (or you could set a specific date)
-                placeholder_date = datetime.now().replace(
-                    hour=time_only.hour, 
-                    minute=time_only.minute, 
-                    second=0
-                )
-                return placeholder_date.strftime('%Y-%m-%d %H:%M:%S')
+                result = datetime.combine(PLACEHOLDER_DATE, time_only.time()).strftime(output_format)
             else:
                 dt = datetime.strptime(timestamp_str, input_format)
-                return dt.strftime(output_format)
+                result = dt.strftime(output_format)
         except ValueError:
             continue
-    
-    # If no format matched, return the original string and log a warning
-    print(f"Warning: Could not parse timestamp: {timestamp_str}")
-    return timestamp_str
+        break
+    else:
+        # If no format matched, return the original string and log a warning
+        print(f"Warning: Could not parse timestamp: {timestamp_str}")
+        result = timestamp_str
+    return result
 
-def convert_markdown_to_csv(input_file, output_file, track_source=False):
-    """Convert a formatted markdown file to CSV."""
-    # Read the entire file content
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Split the content by triple newlines to get individual records
-    records = content.split('\n\n\n')
-    print(f"Found {len(records)} records in file")
+def parse_timestamp(timestamp_str):
+    """Try different timestamp formats."""
+    cached = _TIMESTAMP_CACHE.get(timestamp_str)
+    if cached is not None:
+        return cached
     
-    # Prepare data for CSV
-    data = []
-    source_name = os.path.basename(input_file).replace('.md', '')
+    # Well-formed timestamps skip strptime; it only sees the ones the fast path can't read
+    result = fast_parse_timestamp(timestamp_str) or strptime_timestamp(timestamp_str)
     
-    for idx, record in enumerate(records):
-        record = record.strip()
-        if not record:  # Skip empty records
-            continue
-        
-        # Print a few records to debug if needed
-        if idx < 3:
-            print(f"Debug - Record {idx}:\n{record}")
-        
-        # Process the record
-        lines = record.split('\n')
-        if not lines:
-            continue
+    # Start over rather than grow without bound on unusually varied input
+    if len(_TIMESTAMP_CACHE) >= TIMESTAMP_CACHE_SIZE:
+        _TIMESTAMP_CACHE.clear()
+    _TIMESTAMP_CACHE[timestamp_str] = result
+    return result
+
+def iter_records(file_path):
+    """
+    Yield the records of a markdown file, stripped and non-empty.
+    Records are separated by triple newlines (two consecutive blank lines); the file
+    is read line by line so only the current record is held in memory.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = []
+        blank_count = 0
+        for line in f:
+            line = line.rstrip('\n')
+            lines.append(line)
+            if line:
+                blank_count = 0
+                continue
             
-        first_line = lines[0]
+            blank_count += 1
+            if blank_count == 2:
+                record = '\n'.join(lines).strip()
+                if record:
+                    yield record
+                lines = []
+                blank_count = 0
         
-        # Check if the line contains the em dash
-        if ' — ' in first_line:
-            parts = first_line.split(' — ')
-            if len(parts) >= 2:
-                username = parts[0]
-                timestamp_str = parts[1]
-                
-                # Convert timestamp to standard format
-                timestamp = parse_timestamp(timestamp_str)
-                
-                # Extract message (everything after the first line)
-                if len(lines) > 1:
-                    message = ' '.join(lines[1:])
-                else:
-                    message = ""
-                
-                # Add to data
-                if track_source:
-                    data.append([timestamp, username, message, source_name])
-                else:
-                    data.append([timestamp, username, message])
-                
-                if idx < 3:
-                    print(f"Successfully processed: {username} - {timestamp}")
-            else:
-                if idx < 3:
-                    print(f"Line has em dash but couldn't split properly: {first_line}")
+        record = '\n'.join(lines).strip()
+        if record:
+            yield record
+
+def parse_record(record):
+    """Parse a record into a [timestamp, username, message] row, or None if its first line can't be split."""
+    first_line, _, rest = record.partition('\n')
+    
+    # Split the line at the em dash in a single pass
+    username, sep, timestamp_str = first_line.partition(EM_DASH_SEP)
+    if not (sep and timestamp_str):
+        return None
+    
+    # Convert timestamp to standard format
+    timestamp = parse_timestamp(timestamp_str)
+    
+    # Extract message (everything after the first line, joined onto one line)
+    message = rest.replace('\n', ' ')
+    
+    return [timestamp, username, message]
+
+def iter_rows(records, track_source=False, source_name=None):
+    """Yield a CSV row for each record that parses, with the source column if requested."""
+    for record in records:
+        row = parse_record(record)
+        if row is not None:
+            if track_source:
+                row.append(source_name)
+            yield row
+
+def write_rows(f, writer, rows):
+    """
+    Write rows to the CSV file f, formatting rows that need no quoting directly.
+    Unquoted rows are batched into one write per WRITE_BATCH_SIZE rows; only rows with
+    a comma, quote or line break in a field go through csv.writer.
+    """
+    needs_quoting = CSV_SPECIAL_RE.search
+    pending = []
+    for row in rows:
+        if any(map(needs_quoting, row)):
+            # Keep the file in row order: write out the batch before the quoted row
+            if pending:
+                f.write(''.join(pending))
+                pending = []
+            writer.writerow(row)
         else:
-            if idx < 3:
-                print(f"No em dash found in: {first_line}")
+            pending.append(','.join(row) + CSV_LINE_TERMINATOR)
+            if len(pending) >= WRITE_BATCH_SIZE:
+                f.write(''.join(pending))
+                pending = []
+    if pending:
+        f.write(''.join(pending))
+
+def get_source_name(file_path):
+    """Name recorded in the source column for rows from a file."""
+    return os.path.basename(file_path).replace('.md', '')
+
+def counted(iterable, counter):
+    """Pass items through, advancing counter once per item; next(counter) afterwards gives the total."""
+    return (item for item, _ in zip(iterable, counter))
+
+def convert_markdown_to_csv(input_file, output_file, track_source=False):
+    """Convert a formatted markdown file to CSV."""
+    source_name = get_source_name(input_file)
+    record_counter = count()
+    records = counted(iter_records(input_file), record_counter)
+    
+    # Print a few records to debug if needed
+    head = list(islice(records, 3))
+    for idx, record in enumerate(head):
+        print(f"Debug - Record {idx}:\n{record}")
+        row = parse_record(record)
+        first_line = record.partition('\n')[0]
+        if row is not None:
+            print(f"Successfully processed: {row[1]} - {row[0]}")
+        elif EM_DASH_SEP in first_line:
+            print(f"Line has em dash but couldn't split properly: {first_line}")
+        else:
+            print(f"No em dash found in: {first_line}")
+    
+    # Rows stream straight from the parser into the writer; only a small sample is kept for the summary
+    row_counter = count()
+    rows = counted(iter_rows(chain(head, records), track_source, source_name), row_counter)
     
-    # Write to CSV
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
         writer = csv.writer(f)
         if track_source:
             writer.writerow(['timestamp', 'username', 'message', 'source'])
         else:
             writer.writerow(['timestamp', 'username', 'message'])
-        writer.writerows(data)
+        
+        sample = list(islice(rows, 3))
+        write_rows(f, writer, sample)
+        write_rows(f, writer, rows)
     
-    print(f"Wrote {len(data)} messages to {output_file}")
-    if len(data) > 0:
+    row_count = next(row_counter)
+    print(f"Found {next(record_counter)} records in file")
+    print(f"Wrote {row_count} messages to {output_file}")
+    if sample:
         print("Data sample:")
-        for i, row in enumerate(data[:3]):
+        for i, row in enumerate(sample):
             if track_source:
                 print(f"{i+1}. [{row[3]}] {row[1]} ({row[0]}): {row[2][:50]}...")
             else:
                 print(f"{i+1}. {row[1]} ({row[0]}): {row[2][:50]}...")
     
-    return len(data)
+    return row_count
+
+def parse_markdown_file(file_path, track_source=False):
+    """
+    Parse one markdown file into rows sorted by timestamp.
+    Returns (rows, record_count); runs in a worker process for multi-file conversions.
+    """
+    source_name = get_source_name(file_path)
+    record_counter = count()
+    file_data = list(iter_rows(counted(iter_records(file_path), record_counter), track_source, source_name))
+    record_count = next(record_counter)
+    
+    # Sort locally so the parent only has to merge the files
+    file_data.sort(key=itemgetter(0))
+    return file_data, record_count
 
-def convert_multiple_markdown_files(input_files, output_file, track_source=False):
-    """Convert multiple markdown files to a single CSV."""
-    all_data = []
+def convert_multiple_markdown_files(input_files, output_file, track_source=False, assume_sorted=False):
+    """
+    Convert multiple markdown files to a single CSV.
+    With assume_sorted, the files are taken to be in chronological order already and
+    rows are streamed to the CSV in input order without being held for sorting.
+    """
     total_records = 0
+    total_rows = 0
+    sample = []
     
     if track_source:
         headers = ['timestamp', 'username', 'message', 'source']
     else:
         headers = ['timestamp', 'username', 'message']
     
-    # Process each input file
-    for file_path in input_files:
-        print(f"Reading file: {file_path}")
-        source_name = os.path.basename(file_path).replace('.md', '')
-        
-        # Read the entire file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Split the content by triple newlines to get individual records
-        records = content.split('\n\n\n')
-        records = [r.strip() for r in records if r.strip()]
-        print(f"  Found {len(records)} records")
-        total_records += len(records)
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
         
-        # Process records
-        file_data = []
-        for record in records:
-            lines = record.split('\n')
-            if not lines:
-                continue
+        if assume_sorted:
+            # Stream each file straight into the writer, reusing it across files
+            for file_path in input_files:
+                print(f"Reading file: {file_path}")
+                record_counter = count()
+                row_counter = count()
+                records = counted(iter_records(file_path), record_counter)
+                rows = counted(iter_rows(records, track_source, get_source_name(file_path)), row_counter)
+                
+                head = list(islice(rows, 3 - len(sample)))
+                sample.extend(head)
+                write_rows(f, writer, head)
+                write_rows(f, writer, rows)
                 
-            first_line = lines[0]
+                record_count = next(record_counter)
+                row_count = next(row_counter)
+                print(f"  Found {record_count} records")
+                print(f"  Successfully processed {row_count} records")
+                total_records += record_count
+                total_rows += row_count
+        else:
+            # Parse the files in parallel; for a few files the pool startup isn't worth it
+            if len(input_files) >= MIN_PARALLEL_FILES:
+                with ProcessPoolExecutor() as executor:
+                    results = list(executor.map(parse_markdown_file, input_files,
+                                                [track_source] * len(input_files)))
+            else:
+                results = [parse_markdown_file(file_path, track_source) for file_path in input_files]
             
-            # Check if the line contains the em dash
-            if ' — ' in first_line:
-                parts = first_line.split(' — ')
-                if len(parts) >= 2:
-                    username = parts[0]
-                    timestamp_str = parts[1]
-                    
-                    # Convert timestamp to standard format
-                    timestamp = parse_timestamp(timestamp_str)
-                    
-                    # Extract message (everything after the first line)
-                    if len(lines) > 1:
-                        message = ' '.join(lines[1:])
-                    else:
-                        message = ""
-                    
-                    # Add to data
-                    if track_source:
-                        file_data.append([timestamp, username, message, source_name])
-                    else:
-                        file_data.append([timestamp, username, message])
-        
-        print(f"  Successfully processed {len(file_data)} records")
-        all_data.extend(file_data)
-    
-    # Sort all data by timestamp
-    try:
-        all_data.sort(key=lambda x: x[0])
-        print("  Records sorted chronologically")
-    except:
-        print("Warning: Could not sort by timestamp due to format inconsistencies")
-    
-    # Write to CSV
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-        writer.writerows(all_data)
+            per_file_data = []
+            for file_path, (file_data, record_count) in zip(input_files, results):
+                print(f"Reading file: {file_path}")
+                print(f"  Found {record_count} records")
+                print(f"  Successfully processed {len(file_data)} records")
+                total_records += record_count
+                total_rows += len(file_data)
+                per_file_data.append(file_data)
+            
+            # Each file is already sorted, so merge them by timestamp instead of sorting everything again
+            merged = heapq.merge(*per_file_data, key=itemgetter(0))
+            sample = list(islice(merged, 3))
+            print("  Records sorted chronologically")
+            write_rows(f, writer, sample)
+            write_rows(f, writer, merged)
     
     print(f"\nTotal found records across all files: {total_records}")
-    print(f"Successfully processed and wrote {len(all_data)} records to {output_file}")
-    if all_data:
+    print(f"Successfully processed and wrote {total_rows} records to {output_file}")
+    if sample:
         print("\nData sample:")
-        for i, row in enumerate(all_data[:3]):
+        for i, row in enumerate(sample):
             if track_source:
                 print(f"{i+1}. [{row[3]}] {row[1]} ({row[0]}): {row[2][:50]}...")
             else:
                 print(f"{i+1}. {row[1]} ({row[0]}): {row[2][:50]}...")
     
-    return len(all_data)
+    return total_rows
 
-def main():
-    """Main entry point for the script."""
+def main(argv=None):
+    """Main entry point for the script; argv defaults to sys.argv. Returns an exit code."""
     parser = argparse.ArgumentParser(
         description="Convert formatted markdown files to CSV",
         formatter_class=argparse.RawDescriptionHelpFormatter
@@ -231,8 +370,10 @@ def main():
                        help="Path to output CSV file")
     parser.add_argument('--track-source', action='store_true',
                        help="Add source column to CSV to track which file each record came from")
+    parser.add_argument('--assume-sorted', action='store_true',
+                       help="Input files are already in chronological order; stream them without sorting")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     if len(args.input) == 1:
         # Single file conversion
@@ -252,7 +393,8 @@ def main():
                 return 1
         
         print(f"Converting multiple markdown files: {', '.join(args.input)}")
-        count = convert_multiple_markdown_files(args.input, args.output, args.track_source)
+        count = convert_multiple_markdown_files(args.input, args.output, args.track_source,
+                                                args.assume_sorted)
         print(f"Conversion complete. {count} records written to {args.output}")
     
     return 0
@@ -8,42 +8,416 @@ It allows for comprehensive analysis that leverages all available data sources.
 """
 
 import os
-import json
+import sys
+import gzip
+import orjson
 import logging
 import argparse
 import time
+import heapq
+import random
+import hashlib
 import asyncio
 import aiohttp
+import numpy as np
 from datetime import datetime
-import chromadb
-from chromadb.utils import embedding_functions
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import itemgetter
 from dotenv import load_dotenv
-import anthropic
-import os
+from log_utils import setup_script_logging
 
 # Set environment variable to suppress tokenizers warning
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-import openai
-
-# Set up logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-    
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join('logs', f'multi_llm_combined_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')),
-        logging.StreamHandler()
-    ]
-)
+
 logger = logging.getLogger(__name__)
 
+# Shared HTTP session for all provider calls, created lazily by get_session()
+_SESSION = None
+
+# Thread pool for Chroma queries, created by get_chroma_executor()
+_CHROMA_EXECUTOR = None
+
+# Single thread for prompt embedding, created by get_embedding_executor()
+_EMBEDDING_EXECUTOR = None
+
+# Embedding functions, database clients and collections reused across prompts in a run
+_EMBEDDER_CACHE = {}
+_CLIENT_CACHE = {}
+_COLLECTION_CACHE = {}
+
+# Tokenizer used to measure prompt context, loaded by get_token_encoding()
+_TOKEN_ENCODING = None
+
+# System prompt for analyses of retrieved documentation and chat chunks
+ANALYSIS_SYSTEM_PROMPT = """
+        You are an expert data analyst specializing in community feedback analysis and documentation.
+        Your task is to analyze both official documentation and chat conversations to extract actionable insights.
+        Focus on identifying patterns, categorizing issues, and providing concrete recommendations.
+        
+        When creating response documents:
+        1. Prioritize information from official documentation over community conversations
+        2. Use community conversations to identify common questions and pain points
+        3. Format your output in a clear, structured manner with proper headings and sections
+        4. For technical information, include code examples when relevant
+        5. For command-line instructions, use proper formatting
+        
+        Use a professional, analytical tone and organize your findings clearly.
+        """
+
+# Model env variable and default for each provider
+PROVIDER_MODELS = {
+    "openai": ("OPENAI_MODEL", "gpt-4o"),
+    "anthropic": ("ANTHROPIC_MODEL", "claude-3-opus-20240229"),
+    "gemini": ("GEMINI_MODEL", "gemini-1.5-pro")
+}
+
+# Requests-per-minute env variable and default for each provider
+PROVIDER_RPM = {
+    "openai": ("OPENAI_RPM", "500"),
+    "anthropic": ("ANTHROPIC_RPM", "50"),
+    "gemini": ("GEMINI_RPM", "60")
+}
+
+# Maximum in-flight requests env variable and default for each provider
+PROVIDER_CONCURRENCY = {
+    "openai": ("OPENAI_CONCURRENCY", "8"),
+    "anthropic": ("ANTHROPIC_CONCURRENCY", "4"),
+    "gemini": ("GEMINI_CONCURRENCY", "8")
+}
+
+# Rate limiters and concurrency caps per provider, shared by every concurrent prompt;
+# semaphores are kept per event loop, since each asyncio.run() in a process starts a new one
+_RATE_LIMITERS = {}
+_PROVIDER_SEMAPHORES = {}
+
+# HTTP statuses worth retrying: rate limited, overloaded or transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+
+class SafeNameTable(dict):
+    """str.translate table mapping non-alphanumeric characters to '_', filled in as characters are seen"""
+    
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        self[codepoint] = char if char.isalnum() else "_"
+        return self[codepoint]
+
+# Shared translate table for turning prompt text into file names
+SAFE_NAME_TABLE = SafeNameTable()
+
+# Streamed completions can take minutes in total, so only bound the wait between reads
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=120)
+
+# Characters of streamed text collected before they are written out to the reply's file
+STREAM_FLUSH_CHARS = 4096
+
+# Stands in for the user message in request payloads until render_body splices in the encoded text
+USER_MESSAGE_PLACEHOLDER = "\x00user_message\x00"
+USER_MESSAGE_PLACEHOLDER_JSON = orjson.dumps(USER_MESSAGE_PLACEHOLDER)
+
+def get_session():
+    """
+    Return the shared aiohttp session, creating it on first use
+    Reusing one connection pool avoids a new TCP/TLS handshake and DNS lookup per request.
+    Use it as `async with get_session() as session:` so it is closed when the run finishes.
+    """
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=20, ttl_dns_cache=300, keepalive_timeout=30)
+        _SESSION = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=120, connect=10)
+        )
+    return _SESSION
+
+def get_chroma_executor():
+    """
+    Return the thread pool for blocking vector DB calls, sized by CHROMA_WORKERS
+    Kept apart from the default executor, so file writes never queue behind searches.
+    """
+    global _CHROMA_EXECUTOR
+    if _CHROMA_EXECUTOR is None:
+        _CHROMA_EXECUTOR = ThreadPoolExecutor(
+            max_workers=max(1, int(os.getenv("CHROMA_WORKERS", "2"))),
+            thread_name_prefix="chroma"
+        )
+    return _CHROMA_EXECUTOR
+
+async def run_in_chroma_executor(func, *args):
+    """Run a blocking vector DB call on the Chroma thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(get_chroma_executor(), func, *args)
+
+def get_embedding_executor():
+    """
+    Return the single thread that encodes prompts
+    The embedding model is shared and can't encode from two threads at once, so prompts
+    queue here instead of holding Chroma workers while they wait for it.
+    """
+    global _EMBEDDING_EXECUTOR
+    if _EMBEDDING_EXECUTOR is None:
+        _EMBEDDING_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+    return _EMBEDDING_EXECUTOR
+
+def get_embedding_function(model_name):
+    """Return the embedding function for a model, loading the weights only once per process"""
+    # Imported here so provider calls (e.g. the toolkit's fallback) don't load torch and chromadb
+    from vector_db_utils import SentenceTransformerEmbedder
+    
+    if model_name not in _EMBEDDER_CACHE:
+        logger.info(f"Initializing embedding model: {model_name}")
+        _EMBEDDER_CACHE[model_name] = SentenceTransformerEmbedder(model_name)
+    return _EMBEDDER_CACHE[model_name]
+
+def get_client(db_path):
+    """Return the vector database client for a path, opening it only once per process"""
+    from vector_db_utils import get_chroma_client
+    
+    if db_path not in _CLIENT_CACHE:
+        _CLIENT_CACHE[db_path] = get_chroma_client(db_path)
+    return _CLIENT_CACHE[db_path]
+
+def get_collection(db_path, collection_name, embedding_function):
+    """Return a collection handle, caching it so Chroma doesn't re-read its metadata for every prompt"""
+    key = (db_path, collection_name)
+    if key not in _COLLECTION_CACHE:
+        _COLLECTION_CACHE[key] = get_client(db_path).get_collection(
+            name=collection_name,
+            embedding_function=embedding_function
+        )
+    return _COLLECTION_CACHE[key]
+
+def get_model(provider):
+    """Return the configured model name for a provider"""
+    env_var, default = PROVIDER_MODELS[provider]
+    return os.getenv(env_var, default)
+
+def get_token_encoding():
+    """
+    Return the cl100k_base tokenizer, or None if tiktoken isn't available
+    Callers fall back to estimating 4 characters per token.
+    """
+    global _TOKEN_ENCODING
+    if _TOKEN_ENCODING is None:
+        try:
+            import tiktoken
+            _TOKEN_ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable, estimating token counts from length: {e}")
+            _TOKEN_ENCODING = False
+    return _TOKEN_ENCODING or None
+
+def count_tokens(texts):
+    """Return a numpy array with the token count of each text"""
+    encoding = get_token_encoding()
+    if encoding is None:
+        return np.fromiter(map(len, texts), dtype=np.float64, count=len(texts)) / 4
+    return np.fromiter(map(len, encoding.encode_ordinary_batch(texts)), dtype=np.int64, count=len(texts))
+
+def get_response_cache(db_path, embedding_function):
+    """
+    Return the collection that caches LLM analyses, keyed by the embedding of the prompt template
+    Uses cosine distance so RESPONSE_CACHE_MAX_DISTANCE reads as 1 - similarity.
+    """
+    collection_name = os.getenv("RESPONSE_CACHE_COLLECTION", "llm_response_cache")
+    key = (db_path, collection_name)
+    if key not in _COLLECTION_CACHE:
+        _COLLECTION_CACHE[key] = get_client(db_path).get_or_create_collection(
+            name=collection_name,
+            embedding_function=embedding_function,
+            metadata={"hnsw:space": "cosine"}
+        )
+    return _COLLECTION_CACHE[key]
+
+def lookup_cached_response(cache, query_embedding, provider, user_message):
+    """
+    Return a cached analysis from the same provider and model for a near-identical prompt, or None
+    The retrieved context must match too, so a different --k or a rebuilt collection misses the cache.
+    """
+    from vector_db_utils import content_hash_id
+    
+    max_distance = float(os.getenv("RESPONSE_CACHE_MAX_DISTANCE", "0.05"))
+    ttl_hours = float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "24"))
+    results = cache.query(
+        query_embeddings=[query_embedding],
+        n_results=1,
+        where={"$and": [
+            {"provider": provider},
+            {"model": get_model(provider)},
+            {"context": content_hash_id(user_message)},
+            {"ts": {"$gte": time.time() - ttl_hours * 3600}}
+        ]},
+        include=["documents", "distances"]
+    )
+    if results["documents"][0] and results["distances"][0][0] < max_distance:
+        return results["documents"][0][0]
+    return None
+
+def store_cached_response(cache, query_embedding, provider, user_message, response):
+    """Save a provider's analysis in the response cache"""
+    from vector_db_utils import content_hash_id
+    
+    model = get_model(provider)
+    cache.upsert(
+        ids=[content_hash_id(f"{model}\n{user_message}", prefix=f"{provider}_")],
+        embeddings=[query_embedding],
+        documents=[response],
+        metadatas=[{"provider": provider, "model": model, "context": content_hash_id(user_message), "ts": time.time()}]
+    )
+
+class RateLimiter:
+    """Spaces requests evenly so that at most `rate` start in any `period` seconds"""
+    
+    def __init__(self, rate, period=60):
+        self.interval = period / rate
+        self.next_slot = 0.0
+    
+    async def wait(self):
+        """Reserve the next free slot and sleep until it comes up"""
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+def get_rate_limiter(provider):
+    """Return the rate limiter for a provider, sized from its *_RPM env variable"""
+    if provider not in _RATE_LIMITERS:
+        env_var, default = PROVIDER_RPM[provider]
+        _RATE_LIMITERS[provider] = RateLimiter(max(1, int(os.getenv(env_var, default))))
+    return _RATE_LIMITERS[provider]
+
+def get_provider_semaphore(provider):
+    """
+    Return the semaphore capping a provider's in-flight requests, sized from its *_CONCURRENCY env variable
+    Created on first use in each event loop, so a later asyncio.run() never waits on one bound to a closed loop.
+    """
+    # Semaphores reference their loop, so drop those of loops that have finished
+    for loop in [loop for loop in _PROVIDER_SEMAPHORES if loop.is_closed()]:
+        del _PROVIDER_SEMAPHORES[loop]
+    
+    semaphores = _PROVIDER_SEMAPHORES.setdefault(asyncio.get_running_loop(), {})
+    if provider not in semaphores:
+        env_var, default = PROVIDER_CONCURRENCY[provider]
+        semaphores[provider] = asyncio.Semaphore(max(1, int(os.getenv(env_var, default))))
+    return semaphores[provider]
+
+def retry_delay(attempt, retry_after=None):
+    """Seconds to wait before a retry: the server's Retry-After if given, else full-jitter exponential backoff"""
+    try:
+        return min(float(retry_after), 60.0)
+    except (TypeError, ValueError):
+        return random.uniform(1, min(60, 2 ** attempt))
+
+def render_body(payload, user_message_json):
+    """
+    Serialize a request payload into a JSON body
+    The user message is JSON-encoded once per prompt and spliced in, since it is by far the largest field
+    and is shared by every provider.
+    """
+    return orjson.dumps(payload).replace(USER_MESSAGE_PLACEHOLDER_JSON, user_message_json, 1)
+
+async def post_with_retry(session, provider, url, read_body=None, **kwargs):
+    """
+    POST to a provider API under its rate limit and concurrency cap, retrying 429/5xx responses and connection errors
+    Returns (status, body): on HTTP 200 the result of read_body(response), or the parsed JSON
+    if no reader is given, otherwise the error text.
+    """
+    max_attempts = max(1, int(os.getenv("LLM_MAX_ATTEMPTS", "6")))
+    for attempt in range(1, max_attempts + 1):
+        retry_after = None
+        # Backoff sleeps happen outside the semaphore, so a retrying request doesn't hold a slot
+        async with get_provider_semaphore(provider):
+            await get_rate_limiter(provider).wait()
+            try:
+                async with session.post(url, **kwargs) as response:
+                    if response.status == 200:
+                        return response.status, await (read_body(response) if read_body else response.json())
+                    error_text = await response.text()
+                    if response.status not in RETRY_STATUSES or attempt == max_attempts:
+                        return response.status, error_text
+                    retry_after = response.headers.get("retry-after")
+                    reason = f"HTTP {response.status}"
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == max_attempts:
+                    raise
+                reason = type(e).__name__
+        
+        delay = retry_delay(attempt, retry_after)
+        logger.warning(f"{provider} request failed ({reason}), retrying in {delay:.1f}s (attempt {attempt}/{max_attempts})")
+        await asyncio.sleep(delay)
+
+async def read_text_stream(response, extract_text, text_file=None):
+    """
+    Collect a streamed (server-sent events) completion and return the full text
+    extract_text maps each decoded event to its piece of text (or None). Pieces are appended to
+    text_file every STREAM_FLUSH_CHARS characters, so partial output is visible long before the
+    reply is complete; the writes run in a worker thread, so other streams never wait on the disk.
+    """
+    def write_pieces(new_pieces, close=False):
+        out.write("".join(new_pieces))
+        out.flush()
+        if close:
+            out.close()
+    
+    pieces = []
+    written = 0
+    pending_chars = 0
+    out = await asyncio.to_thread(open, text_file, "w", encoding="utf-8") if text_file else None
+    try:
+        async for line in response.content:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            text = extract_text(orjson.loads(data))
+            if text:
+                pieces.append(text)
+                pending_chars += len(text)
+                if out and pending_chars >= STREAM_FLUSH_CHARS:
+                    await asyncio.to_thread(write_pieces, pieces[written:])
+                    written = len(pieces)
+                    pending_chars = 0
+    finally:
+        if out:
+            await asyncio.to_thread(write_pieces, pieces[written:], True)
+    return "".join(pieces)
+
+def openai_stream_text(event):
+    """Return the text delta from an OpenAI chat completion stream event"""
+    if "error" in event:
+        raise RuntimeError(event["error"].get("message", event["error"]))
+    choices = event.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content")
+
+def anthropic_stream_text(event):
+    """Return the text delta from an Anthropic messages stream event"""
+    if event.get("type") == "error":
+        raise RuntimeError(event["error"].get("message", event["error"]))
+    if event.get("type") == "content_block_delta":
+        return event["delta"].get("text")
+    return None
+
+async def write_output(path, data):
+    """Write text or bytes to a file in a worker thread, so other prompts keep running meanwhile"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    
+    def write():
+        with open(path, "wb") as f:
+            f.write(data)
+    
+    await asyncio.to_thread(write)
+
 def ensure_directory(directory):
     """Ensure a directory exists"""
-    if not os.path.exists(directory):
+    try:
         os.makedirs(directory)
         logger.info(f"Created directory: {directory}")
+    except FileExistsError:
+        pass
 
 def load_environment():
     """Load environment variables and validate required ones exist"""
@@ -71,170 +445,219 @@ def load_prompt_from_file(prompt_file):
         logger.error(f"Error loading prompt file {prompt_file}: {e}")
         return None
 
-async def query_openai(user_message, system_prompt=""):
-    """Query the OpenAI API for analysis"""
+async def query_openai(session, user_message_json, system_prompt="", text_file=None):
+    """Query the OpenAI API for analysis, streaming the reply into text_file if given"""
     try:
         api_key = os.getenv("OPENAI_API_KEY")
         
         # Use the direct API call approach for consistency
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-            
-            model = os.getenv("OPENAI_MODEL", "gpt-4o")
-            logger.info(f"Using OpenAI model: {model}")
-            logger.info("Using direct API call for OpenAI")
-            
-            payload = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 4000
-            }
-            
-            async with session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if "choices" in data and len(data["choices"]) > 0:
-                        return data["choices"][0]["message"]["content"]
-                    else:
-                        logger.error(f"Unexpected OpenAI API response structure: {data}")
-                        return "Error: Unexpected OpenAI API response structure"
-                else:
-                    error_text = await response.text()
-                    logger.error(f"OpenAI API Error: {response.status} - {error_text}")
-                    return f"Error generating OpenAI analysis: HTTP {response.status}"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        
+        model = get_model("openai")
+        logger.info(f"Using OpenAI model: {model}")
+        logger.info("Using direct API call for OpenAI")
         
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": USER_MESSAGE_PLACEHOLDER}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 4000,
+            "stream": True
+        }
+        
+        status, data = await post_with_retry(
+            session,
+            "openai",
+            "https://api.openai.com/v1/chat/completions",
+            read_body=lambda response: read_text_stream(response, openai_stream_text, text_file),
+            headers=headers,
+            data=render_body(payload, user_message_json),
+            timeout=STREAM_TIMEOUT
+        )
+        if status == 200:
+            if data:
+                return data
+            else:
+                logger.error("Unexpected OpenAI API response: stream contained no text")
+                return "Error: Unexpected OpenAI API response structure"
+        else:
+            logger.error(f"OpenAI API Error: {status} - {data}")
+            return f"Error generating OpenAI analysis: HTTP {status}"
+    
     except Exception as e:
         logger.error(f"Error with OpenAI API: {e}")
         return f"Error generating OpenAI analysis: {str(e)}"
 
-async def query_anthropic(user_message, system_prompt=""):
-    """Query the Anthropic API for analysis"""
+async def query_anthropic(session, user_message_json, system_prompt="", text_file=None):
+    """Query the Anthropic API for analysis, streaming the reply into text_file if given"""
     try:
         api_key = os.getenv("ANTHROPIC_API_KEY")
-        model = os.getenv("ANTHROPIC_MODEL", "claude-3-opus-20240229")
+        model = get_model("anthropic")
         logger.info(f"Using Anthropic model: {model}")
         
-        # Use direct API call with a new session for each request
+        # Use direct API call over the shared session
         logger.info("Using direct API call for Anthropic")
-        connector = aiohttp.TCPConnector(ssl=False)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            api_version = os.getenv("ANTHROPIC_API_VERSION", "2023-06-01")
-            headers = {
-                "Content-Type": "application/json",
-                "x-api-key": api_key,
-                "anthropic-version": api_version
-            }
-            
-            payload = {
-                "model": model,
-                "max_tokens": 4000,
-                "system": system_prompt,
-                "messages": [
-                    {"role": "user", "content": user_message}
-                ]
-            }
-            
-            async with session.post(
-                "https://api.anthropic.com/v1/messages",
-                headers=headers,
-                json=payload,
-                ssl=False
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    # Try different response formats
-                    if "content" in data and len(data["content"]) > 0:
-                        # New API format
-                        if isinstance(data["content"][0], dict) and "text" in data["content"][0]:
-                            return data["content"][0]["text"]
-                        else:
-                            # Try to extract text in other ways
-                            return str(data["content"][0])
-                    elif "completion" in data:
-                        # Old API format
-                        return data["completion"]
-                    else:
-                        # Last resort
-                        return str(data)
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Anthropic API Error: {response.status} - {error_text}")
-                    return f"Error generating Anthropic analysis: HTTP {response.status}"
-                
+        api_version = os.getenv("ANTHROPIC_API_VERSION", "2023-06-01")
+        headers = {
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": api_version
+        }
+        
+        payload = {
+            "model": model,
+            "max_tokens": 4000,
+            "system": system_prompt,
+            "messages": [
+                {"role": "user", "content": USER_MESSAGE_PLACEHOLDER}
+            ],
+            "stream": True
+        }
+        
+        status, data = await post_with_retry(
+            session,
+            "anthropic",
+            "https://api.anthropic.com/v1/messages",
+            read_body=lambda response: read_text_stream(response, anthropic_stream_text, text_file),
+            headers=headers,
+            data=render_body(payload, user_message_json),
+            ssl=False,
+            timeout=STREAM_TIMEOUT
+        )
+        if status == 200:
+            if data:
+                return data
+            else:
+                logger.error("Unexpected Anthropic API response: stream contained no text")
+                return "Error: Unexpected Anthropic API response structure"
+        else:
+            logger.error(f"Anthropic API Error: {status} - {data}")
+            return f"Error generating Anthropic analysis: HTTP {status}"
+        
     except Exception as e:
         logger.error(f"Error with Anthropic API: {e}")
         return f"Error generating Anthropic analysis: {str(e)}"
 
-async def query_gemini(user_message, system_prompt=""):
-    """Query the Google Gemini API for analysis"""
+async def query_gemini(session, user_message_json, system_prompt="", text_file=None):
+    """Query the Google Gemini API for analysis, streaming the reply into text_file if given"""
     try:
         api_key = os.getenv("GEMINI_API_KEY")
         
         # Use aiohttp for async HTTP requests
-        async with aiohttp.ClientSession() as session:
-            # Prepare the API request
-            model = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
-            logger.info(f"Using Gemini model: {model}")
-            
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            # Construct the messages payload
-            # Use Gemini's proper system prompt capability
-            payload = {
-                "contents": [
-                    {"role": "user", "parts": [{"text": user_message}]}
-                ],
-                "system_instruction": {"parts": [{"text": system_prompt}]} if system_prompt else None,
-                "generationConfig": {
-                    "temperature": 0.3,
-                    "maxOutputTokens": 4000,
-                    "topP": 0.95
-                }
+        # Prepare the API request
+        model = get_model("gemini")
+        logger.info(f"Using Gemini model: {model}")
+        
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
+        headers = {
+            "Content-Type": "application/json"
+        }
+        
+        # Construct the messages payload
+        # Use Gemini's proper system prompt capability
+        payload = {
+            "contents": [
+                {"role": "user", "parts": [{"text": USER_MESSAGE_PLACEHOLDER}]}
+            ],
+            "system_instruction": {"parts": [{"text": system_prompt}]} if system_prompt else None,
+            "generationConfig": {
+                "temperature": 0.3,
+                "maxOutputTokens": 4000,
+                "topP": 0.95
             }
-            
-            # Remove None entries from contents
-            payload["contents"] = [content for content in payload["contents"] if content is not None]
-            
-            # Add API key as query parameter
-            params = {"key": api_key}
-            
-            # Send the request
-            async with session.post(url, headers=headers, json=payload, params=params) as response:
-                if response.status == 200:
-                    response_data = await response.json()
-                    
-                    # Parse the response
-                    if "candidates" in response_data and len(response_data["candidates"]) > 0:
-                        generated_text = response_data["candidates"][0]["content"]["parts"][0]["text"]
-                        return generated_text
-                    else:
-                        logger.error(f"Unexpected Gemini API response structure: {response_data}")
-                        return "Error: Unexpected Gemini API response structure"
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Gemini API error: {response.status} - {error_text}")
-                    return f"Error generating Gemini analysis: HTTP {response.status} - {error_text[:200]}"
-                
+        }
+        
+        # Remove None entries from contents
+        payload["contents"] = [content for content in payload["contents"] if content is not None]
+        
+        # Add API key as query parameter, and ask for server-sent events
+        params = {"key": api_key, "alt": "sse"}
+        
+        # Blocked or empty responses carry a finish reason instead of content
+        finish_reasons = []
+        
+        def extract_text(event):
+            """Return the text from a Gemini stream event, noting its finish reason"""
+            candidates = event.get("candidates") or [{}]
+            if "finishReason" in candidates[0]:
+                finish_reasons.append(candidates[0]["finishReason"])
+            return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+        
+        # Send the request
+        status, response_data = await post_with_retry(
+            session,
+            "gemini",
+            url,
+            read_body=lambda response: read_text_stream(response, extract_text, text_file),
+            headers=headers,
+            data=render_body(payload, user_message_json),
+            params=params,
+            timeout=STREAM_TIMEOUT
+        )
+        if status == 200:
+            if response_data:
+                return response_data
+            else:
+                reason = finish_reasons[-1] if finish_reasons else "unknown reason"
+                logger.error(f"Gemini returned no content: {reason}")
+                return f"Error: Gemini returned no content ({reason})"
+        else:
+            logger.error(f"Gemini API error: {status} - {response_data}")
+            return f"Error generating Gemini analysis: HTTP {status} - {response_data[:200]}"
+        
     except Exception as e:
         logger.error(f"Error with Gemini API: {e}")
         return f"Error generating Gemini analysis: {str(e)}"
 
-async def query_all_providers(user_message, system_prompt, providers=None):
-    """Query selected LLM providers concurrently"""
+def query_collection(db_path, collection_name, embedding_function, query_embedding, k):
+    """Return the k nearest chunks in a collection to a precomputed query embedding"""
+    collection = get_collection(db_path, collection_name, embedding_function)
+    return collection.query(
+        query_embeddings=[query_embedding],
+        n_results=k,
+        include=["documents", "metadatas", "distances", "embeddings"]
+    )
+
+def deduplicate_results(results, min_similarity):
+    """
+    Drop repeated chunks from results sorted closest first
+    A chunk is dropped if its text was already kept, or if its embedding has cosine similarity
+    of at least min_similarity with a kept chunk's. Each result is (document, metadata, distance, embedding).
+    """
+    seen_texts = set()
+    unique = []
+    for result in results:
+        if result[0] not in seen_texts:
+            seen_texts.add(result[0])
+            unique.append(result)
+    if len(unique) < 2:
+        return unique
+    
+    # Pairwise cosine similarity of all chunks in one matrix product
+    embeddings = np.asarray([result[3] for result in unique], dtype=np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similarity = embeddings @ embeddings.T
+    
+    kept = [0]
+    for i in range(1, len(unique)):
+        if similarity[i, kept].max() < min_similarity:
+            kept.append(i)
+    return [unique[i] for i in kept]
+
+async def query_all_providers(session, user_message, system_prompt, providers=None, response_cache=None, query_embedding=None,
+                              output_base=None):
+    """
+    Query selected LLM providers concurrently over the shared session
+    Yields (provider, analysis) pairs in the order they finish, so callers can save each one right away.
+    With output_base, each reply is also streamed into {output_base}_{provider}.txt while it is generated.
+    With a response cache, providers that already analyzed a near-identical prompt are not called again.
+    """
     # Default to all providers if none specified
     if providers is None:
         providers = ["openai", "anthropic", "gemini"]
@@ -246,34 +669,216 @@ async def query_all_providers(user_message, system_prompt, providers=None):
         "gemini": query_gemini
     }
     
-    # Create tasks for selected providers
-    tasks = []
     selected_providers = []
-    
     for provider in providers:
         if provider in provider_functions:
-            tasks.append(provider_functions[provider](user_message, system_prompt))
             selected_providers.append(provider)
         else:
             logger.warning(f"Unknown provider: {provider}")
     
-    if not tasks:
+    if not selected_providers:
         logger.error("No valid providers selected")
-        return {}
+        return
+    
+    # Encode the shared user message once for all providers
+    user_message_json = orjson.dumps(user_message)
+    
+    # Yield cached analyses straight away
+    cached_providers = set()
+    if response_cache is not None:
+        for provider in selected_providers:
+            try:
+                cached = await run_in_chroma_executor(lookup_cached_response, response_cache, query_embedding, provider, user_message)
+            except Exception as e:
+                logger.warning(f"Error reading response cache for {provider}: {e}")
+                continue
+            if cached is not None:
+                logger.info(f"Using cached {provider} analysis")
+                cached_providers.add(provider)
+                yield provider, cached
+    
+    async def run_provider(provider):
+        """Query one provider and return its name with the analysis"""
+        try:
+            text_file = f"{output_base}_{provider}.txt" if output_base else None
+            result = await provider_functions[provider](session, user_message_json, system_prompt, text_file)
+        except Exception as e:
+            # Convert exceptions to error messages
+            return provider, f"Error: {str(e)}"
+        
+        if response_cache is not None and not result.startswith("Error"):
+            try:
+                await run_in_chroma_executor(store_cached_response, response_cache, query_embedding, provider, user_message, result)
+            except Exception as e:
+                logger.warning(f"Error saving {provider} analysis to response cache: {e}")
+        return provider, result
+    
+    # Run the remaining providers concurrently, yielding each analysis as soon as it arrives
+    pending = [run_provider(provider) for provider in selected_providers if provider not in cached_providers]
+    for next_result in asyncio.as_completed(pending):
+        yield await next_result
+
+async def build_user_message(prompt_template, k, db_path, embedding_function):
+    """
+    Retrieve the chunks closest to a prompt from both collections and build the user message for the LLMs
+    Returns (user_message, top_results, query_embedding), or None if nothing was retrieved.
+    """
+    # Embed the prompt once and reuse the vector for both collections
+    loop = asyncio.get_running_loop()
+    query_embedding = (await loop.run_in_executor(get_embedding_executor(), embedding_function, [prompt_template]))[0]
+    
+    chat_collection_name = os.getenv("CHAT_COLLECTION_NAME", "chat_messages")
+    docs_collection_name = os.getenv("DOCS_COLLECTION_NAME", "documentation")
+    logger.info(f"Using chat collection: {chat_collection_name}")
+    logger.info(f"Using Documentation collection: {docs_collection_name}")
+    logger.info(f"Querying both collections to find {k} relevant chunks each...")
+    
+    # Run both searches on the Chroma pool so they overlap and stay off the event loop
+    chat_results, docs_results = await asyncio.gather(
+        run_in_chroma_executor(query_collection, db_path, chat_collection_name, embedding_function, query_embedding, k),
+        run_in_chroma_executor(query_collection, db_path, docs_collection_name, embedding_function, query_embedding, k),
+        return_exceptions=True
+    )
+    
+    # (document, metadata, distance, embedding) tuples from each collection that answered
+    result_sets = []
     
-    # Run all tasks concurrently
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    # Extract relevant conversations
+    if isinstance(chat_results, Exception):
+        logger.warning(f"Error accessing chat collection: {chat_results}")
+        logger.info("Chat collection may not exist. Make sure you've built the vector database using build_vector_db.py")
+    else:
+        result_sets.append(zip(chat_results["documents"][0], chat_results["metadatas"][0],
+                               chat_results["distances"][0], chat_results["embeddings"][0]))
+        logger.info(f"Retrieved {len(chat_results['documents'][0])} chat conversations")
     
-    # Convert exceptions to error messages
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            results[i] = f"Error: {str(result)}"
+    # Extract relevant documentation
+    if isinstance(docs_results, Exception):
+        logger.warning(f"Error accessing Documentation collection: {docs_results}")
+        logger.info("Documentation collection may not exist. Make sure you've run add_docs_to_vector_db.py")
+    else:
+        result_sets.append(zip(docs_results["documents"][0], docs_results["metadatas"][0],
+                               docs_results["distances"][0], docs_results["embeddings"][0]))
+        logger.info(f"Retrieved {len(docs_results['documents'][0])} documentation chunks")
     
-    # Combine results with provider names
-    return dict(zip(selected_providers, results))
+    # Closest chunks across both collections, by distance (similarity)
+    # Chroma returns each collection's results sorted already, so a linear merge is enough
+    top_results = list(islice(heapq.merge(*result_sets, key=itemgetter(2)), 2 * k))
+    if not top_results:
+        logger.error("No documents retrieved from any collection")
+        return None
+    
+    # Duplicates would only spend the token budget on the same content twice
+    retrieved_count = len(top_results)
+    top_results = deduplicate_results(top_results, float(os.getenv("DEDUP_MIN_SIMILARITY", "0.98")))
+    if len(top_results) < retrieved_count:
+        logger.info(f"Dropped {retrieved_count - len(top_results)} duplicate chunks")
+    
+    logger.info(f"Retrieved {len(top_results)} total relevant chunks")
+    
+    # Format each chunk with its source type (documentation or chat)
+    formatted_chunks = []
+    for doc, meta, _, _ in top_results:
+        source_type = meta.get('source_type', '')
+        if source_type == 'documentation':
+            section = meta.get('section', 'Unknown Section')
+            title = meta.get('title', 'Unknown Document')
+            formatted_chunks.append(f"--- DOCUMENTATION: {title} - {section} ---\n{doc}")
+        else:  # Chat or unknown
+            formatted_chunks.append(f"--- CHAT CONVERSATION ---\n{doc}")
+    
+    # Manage token limits by truncating or chunking if needed
+    # Running total of tokens after each chunk
+    cumulative_tokens = np.cumsum(count_tokens(formatted_chunks))
+    total_tokens = cumulative_tokens[-1] if len(cumulative_tokens) else 0
+    
+    # If total tokens exceeds a safe threshold (e.g., 12k tokens), truncate
+    # This leaves room for prompt, system message, and model response
+    max_tokens = int(os.getenv("MAX_INPUT_TOKENS", "12000"))
+    
+    if total_tokens > max_tokens:
+        logger.warning(f"Content may exceed token limit ({total_tokens:.0f} tokens). Truncating.")
+        
+        # Keep the longest run of complete chunks that fits within the token limit
+        cutoff = int(np.searchsorted(cumulative_tokens, max_tokens, side="right"))
+        formatted_chunks = formatted_chunks[:cutoff]
+        logger.info(f"Reduced to {cutoff}/{len(top_results)} chunks")
+    
+    # Join chunks with proper spacing
+    content_text = "\n\n".join(formatted_chunks)
+    
+    # Format user message with conversations
+    user_message = f"""
+        The following are relevant chunks from documentation and chat conversations:
+
+        {content_text}
+
+        {prompt_template}
+        """
+    
+    return user_message, top_results, query_embedding
+
+async def save_combined_results(output_base, prompt_template, analyses, output_files, top_results):
+    """
+    Save the combined JSON and comparison markdown for a prompt's analyses next to its text files
+    Returns the paths of everything written for the prompt.
+    """
+    # List providers in a fixed order in the combined outputs, whatever order they finished in
+    analyses = {provider: analyses[provider] for provider in PROVIDER_MODELS if provider in analyses}
+    
+    # Save the full results with metadata, gzipped since they embed every retrieved chunk
+    json_file = f"{output_base}_combined.json.gz"
+    source_counts = Counter(meta.get('source_type') for _, meta, _, _ in top_results)
+    json_data = orjson.dumps({
+        "prompt": prompt_template,
+        "analyses": analyses,
+        "sources": {
+            "documentation": source_counts['documentation'],
+            "chat": source_counts['chat']
+        },
+        "documents": [doc for doc, _, _, _ in top_results],
+        "metadata": [meta for _, meta, _, _ in top_results],
+        "distances": [distance for _, _, distance, _ in top_results]
+    }, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    await write_output(json_file, await asyncio.to_thread(gzip.compress, json_data, 1))
+    
+    logger.info(f"Results saved to {json_file} and individual text files")
+    print(f"\nFull results saved to: {json_file}")
+    
+    # Create a comparison markdown file
+    comparison_file = f"{output_base}_comparison.md"
+    comparison = [
+        f"# Multi-LLM Analysis Comparison\n\n",
+        f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+        f"## Prompt\n\n```\n{prompt_template}\n```\n\n"
+    ]
+    
+    for provider, analysis in analyses.items():
+        comparison.append(f"## {provider.capitalize()} Analysis\n\n")
+        comparison.append(f"```\n{analysis[:1000]}...\n```\n\n")
+        comparison.append(f"[View full {provider} analysis](./{os.path.basename(output_files[provider])})\n\n")
+    await write_output(comparison_file, "".join(comparison))
+    
+    logger.info(f"Comparison saved to {comparison_file}")
+    print(f"Comparison file: {comparison_file}")
+    
+    return {
+        "json": json_file,
+        "comparison": comparison_file,
+        "text_files": output_files
+    }
 
-async def query_vector_database(prompt_template, k=30, output_dir="outputs", output_name=None):
-    """Query the vector database with a prompt template and generate analyses using multiple LLMs"""
+async def query_vector_database(prompt_template, k=30, output_dir="outputs", output_name=None, session=None, use_cache=True):
+    """
+    Query the vector database with a prompt template and generate analyses using multiple LLMs
+    Pass the batch's shared session to reuse connections; otherwise one is opened for this call.
+    With use_cache, analyses of a near-identical prompt from the last RESPONSE_CACHE_TTL_HOURS are reused.
+    """
+    # Without a shared session, open one for this call
+    if session is None:
+        async with get_session() as session:
+            return await query_vector_database(prompt_template, k, output_dir, output_name, session, use_cache)
+    
     # Load environment variables
     if not load_environment():
         return None
@@ -288,192 +893,49 @@ async def query_vector_database(prompt_template, k=30, output_dir="outputs", out
     ensure_directory(output_dir)
     
     try:
-        # Set up the embedding function
-        logger.info(f"Initializing embedding model: {embedding_model}")
-        embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model
-        )
-        
-        # Connect to the vector database
-        logger.info(f"Connecting to vector database at: {db_path}")
-        client = chromadb.PersistentClient(path=db_path)
-        
-        # Initialize containers for results
-        all_documents = []
-        all_metadata = []
-        all_distances = []
+        # Set up the embedding function (cached, so a batch loads the model once)
+        embedding_function = get_embedding_function(embedding_model)
         
-        # Get the chat collection
-        chat_collection_name = os.getenv("CHAT_COLLECTION_NAME", "chat_messages")
-        logger.info(f"Using chat collection: {chat_collection_name}")
-        try:
-            chat_collection = client.get_collection(
-                name=chat_collection_name,
-                embedding_function=embedding_function
-            )
-            
-            # Query the chat collection
-            logger.info(f"Querying chat collection to find {k} relevant conversations...")
-            chat_results = chat_collection.query(
-                query_texts=[prompt_template],
-                n_results=k,
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            # Extract relevant conversations
-            chat_documents = chat_results["documents"][0]
-            chat_metadata = chat_results["metadatas"][0]
-            chat_distances = chat_results["distances"][0]
-            
-            all_documents.extend(chat_documents)
-            all_metadata.extend(chat_metadata)
-            all_distances.extend(chat_distances)
-            
-            logger.info(f"Retrieved {len(chat_documents)} chat conversations")
-            
-        except Exception as e:
-            logger.warning(f"Error accessing chat collection: {e}")
-            logger.info("Chat collection may not exist. Make sure you've built the vector database using build_vector_db.py")
+        # Connect to the vector database up front, so the query threads share one client
+        get_client(db_path)
         
-        # Get the Documentation collection
-        docs_collection_name = os.getenv("DOCS_COLLECTION_NAME", "documentation")
-        logger.info(f"Using Documentation collection: {docs_collection_name}")
-        try:
-            docs_collection = client.get_collection(
-                name=docs_collection_name,
-                embedding_function=embedding_function
-            )
-            
-            # Query the Documentation collection
-            logger.info(f"Querying Documentation collection to find {k} relevant documents...")
-            docs_results = docs_collection.query(
-                query_texts=[prompt_template],
-                n_results=k,
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            # Extract relevant documentation
-            doc_documents = docs_results["documents"][0]
-            doc_metadata = docs_results["metadatas"][0]
-            doc_distances = docs_results["distances"][0]
-            
-            all_documents.extend(doc_documents)
-            all_metadata.extend(doc_metadata)
-            all_distances.extend(doc_distances)
-            
-            logger.info(f"Retrieved {len(doc_documents)} documentation chunks")
-            
-        except Exception as e:
-            logger.warning(f"Error accessing Documentation collection: {e}")
-            logger.info("Documentation collection may not exist. Make sure you've run add_docs_to_vector_db.py")
-        
-        if not all_documents:
-            logger.error("No documents retrieved from any collection")
+        # Retrieve the closest chunks and build the message the providers analyze
+        context = await build_user_message(prompt_template, k, db_path, embedding_function)
+        if context is None:
             return None
-            
-        # Sort all results by distance (similarity)
-        sorted_results = sorted(zip(all_documents, all_metadata, all_distances), key=lambda x: x[2])
-        
-        # Unzip the sorted results
-        sorted_documents, sorted_metadata, sorted_distances = zip(*sorted_results)
+        user_message, top_results, query_embedding = context
         
-        # Use the sorted documents as our conversations
-        conversations = sorted_documents
-        metadata_list = sorted_metadata
-        distances = sorted_distances
+        # Open the response cache, but still query the providers if it's unavailable
+        response_cache = None
+        if use_cache:
+            try:
+                response_cache = get_response_cache(db_path, embedding_function)
+            except Exception as e:
+                logger.warning(f"Response cache unavailable: {e}")
         
-        logger.info(f"Retrieved {len(conversations)} total relevant chunks")
-        
-        # Format system prompt
-        system_prompt = """
-        You are an expert data analyst specializing in community feedback analysis and documentation.
-        Your task is to analyze both official documentation and chat conversations to extract actionable insights.
-        Focus on identifying patterns, categorizing issues, and providing concrete recommendations.
-        
-        When creating response documents:
-        1. Prioritize information from official documentation over community conversations
-        2. Use community conversations to identify common questions and pain points
-        3. Format your output in a clear, structured manner with proper headings and sections
-        4. For technical information, include code examples when relevant
-        5. For command-line instructions, use proper formatting
-        
-        Use a professional, analytical tone and organize your findings clearly.
-        """
-        
-        # Format each chunk with its source type (documentation or chat)
-        formatted_chunks = []
-        for i, (doc, meta) in enumerate(zip(conversations, metadata_list)):
-            source_type = meta.get('source_type', '')
-            if source_type == 'documentation':
-                section = meta.get('section', 'Unknown Section')
-                title = meta.get('title', 'Unknown Document')
-                formatted_chunks.append(f"--- DOCUMENTATION: {title} - {section} ---\n{doc}")
-            else:  # Chat or unknown
-                formatted_chunks.append(f"--- CHAT CONVERSATION ---\n{doc}")
-        
-        # Manage token limits by truncating or chunking if needed
-        # Estimate rough token count (approx 4 chars = 1 token)
-        total_chars = sum(len(chunk) for chunk in formatted_chunks)
-        estimated_tokens = total_chars / 4
-        
-        # If total estimated tokens exceeds a safe threshold (e.g., 12k tokens), truncate
-        # This leaves room for prompt, system message, and model response
-        max_tokens = int(os.getenv("MAX_INPUT_TOKENS", "12000"))
-        
-        if estimated_tokens > max_tokens:
-            logger.warning(f"Content may exceed token limit ({estimated_tokens:.0f} est. tokens). Truncating.")
-            
-            # Truncate formatted chunks to fit within token limit
-            token_budget = max_tokens
-            selected_chunks = []
-            for chunk in formatted_chunks:
-                chunk_tokens = len(chunk) / 4
-                if token_budget >= chunk_tokens:
-                    selected_chunks.append(chunk)
-                    token_budget -= chunk_tokens
-                else:
-                    # If we can't fit more complete chunks, break
-                    break
-            
-            # Replace formatted chunks with truncated set
-            formatted_chunks = selected_chunks
-            logger.info(f"Reduced to {len(selected_chunks)}/{len(conversations)} chunks")
-        
-        # Join chunks with proper spacing
-        content_text = "\n\n".join(formatted_chunks)
-        
-        # Format user message with conversations
-        user_message = f"""
-        The following are relevant chunks from documentation and chat conversations:
-
-        {content_text}
-
-        {prompt_template}
-        """
-        
-        # Query all LLM providers
-        logger.info("Sending requests to multiple LLM providers...")
-        analyses = await query_all_providers(user_message, system_prompt)
-        
-        # Save the results
+        # Name the outputs up front, so each analysis can be saved as soon as it arrives
         if output_name is None:
             # Generate a more distinct name using first 20 chars + hash
-            prompt_snippet = prompt_template.split("\n")[0][:20].strip()
-            prompt_snippet = "".join(c if c.isalnum() else "_" for c in prompt_snippet)
+            prompt_snippet = prompt_template.split("\n")[0][:20].strip().translate(SAFE_NAME_TABLE)
             # Add a short hash for uniqueness
-            import hashlib
-            prompt_hash = hashlib.md5(prompt_template.encode()).hexdigest()[:6]
+            prompt_hash = hashlib.blake2b(prompt_template.encode(), digest_size=3).hexdigest()
             output_name = f"multi_llm_{prompt_snippet}_{prompt_hash}"
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_base = os.path.join(output_dir, f"{output_name}_{timestamp}")
         
-        # Save individual text analyses
+        # Query all LLM providers, saving individual text analyses as they complete
+        logger.info("Sending requests to multiple LLM providers...")
+        analyses = {}
         output_files = {}
-        for provider, analysis in analyses.items():
+        async for provider, analysis in query_all_providers(session, user_message, ANALYSIS_SYSTEM_PROMPT,
+                                                            response_cache=response_cache,
+                                                            query_embedding=query_embedding,
+                                                            output_base=output_base):
+            # Streamed replies are already on disk; rewrite so cached results and errors land there too
             text_file = f"{output_base}_{provider}.txt"
-            with open(text_file, "w", encoding="utf-8") as f:
-                f.write(analysis)
+            await write_output(text_file, analysis)
+            analyses[provider] = analysis
             output_files[provider] = text_file
             
             # Print preview
@@ -483,50 +945,46 @@ async def query_vector_database(prompt_template, k=30, output_dir="outputs", out
             print(preview)
             print("=" * 80)
         
-        # Save the full results with metadata
-        json_file = f"{output_base}_combined.json"
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump({
-                "prompt": prompt_template,
-                "analyses": analyses,
-                "sources": {
-                    "documentation": sum(1 for m in sorted_metadata if m.get('source_type') == 'documentation'),
-                    "chat": sum(1 for m in sorted_metadata if m.get('source_type') == 'chat')
-                },
-                "documents": list(sorted_documents),
-                "metadata": [dict(m) for m in sorted_metadata],
-                "distances": list(sorted_distances)
-            }, f, indent=2)
-        
-        logger.info(f"Results saved to {json_file} and individual text files")
-        print(f"\nFull results saved to: {json_file}")
-        
-        # Create a comparison markdown file
-        comparison_file = f"{output_base}_comparison.md"
-        with open(comparison_file, "w", encoding="utf-8") as f:
-            f.write(f"# Multi-LLM Analysis Comparison\n\n")
-            f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(f"## Prompt\n\n```\n{prompt_template}\n```\n\n")
-            
-            for provider, analysis in analyses.items():
-                f.write(f"## {provider.capitalize()} Analysis\n\n")
-                f.write(f"```\n{analysis[:1000]}...\n```\n\n")
-                f.write(f"[View full {provider} analysis](./{os.path.basename(output_files[provider])})\n\n")
-        
-        logger.info(f"Comparison saved to {comparison_file}")
-        print(f"Comparison file: {comparison_file}")
-        
-        return {
-            "json": json_file,
-            "comparison": comparison_file,
-            "text_files": output_files
-        }
+        return await save_combined_results(output_base, prompt_template, analyses, output_files, top_results)
         
     except Exception as e:
         logger.error(f"Error querying vector database: {e}", exc_info=True)
         return None
 
-async def run_all_prompts(prompts_dir="prompts"):
+def write_batch_readme(batch_dir, results):
+    """Write the README summarizing a batch run's results, returning its path"""
+    readme_path = os.path.join(batch_dir, "README.md")
+    with open(readme_path, "w", encoding="utf-8") as f:
+        f.write(f"# Multi-LLM Combined Vector Analysis Batch Run\n\n")
+        f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"This batch run analyzed data using multiple LLM providers:\n")
+        f.write(f"- OpenAI (GPT-4o or similar)\n")
+        f.write(f"- Anthropic (Claude 3 Opus or similar)\n")
+        f.write(f"- Google Gemini API\n\n")
+        
+        f.write(f"## Summary\n\n")
+        f.write(f"- Total prompts processed: {len(results)}\n")
+        f.write(f"- Successful: {sum(1 for r in results if r['status'] == 'Success')}\n")
+        f.write(f"- Failed: {sum(1 for r in results if r['status'] == 'Failed')}\n\n")
+        
+        f.write("## Results\n\n")
+        for r in results:
+            prompt_name = r['prompt'].replace('.txt', '')
+            f.write(f"### {prompt_name}\n\n")
+            f.write(f"- Status: {r['status']}\n")
+            if r['status'] == 'Success':
+                f.write(f"- Comparison: [{os.path.basename(r['outputs']['comparison'])}]({os.path.basename(r['outputs']['comparison'])})\n")
+                f.write(f"- Full JSON: [{os.path.basename(r['outputs']['json'])}]({os.path.basename(r['outputs']['json'])})\n")
+                f.write(f"- Individual analyses:\n")
+                for provider, file_path in r['outputs']['text_files'].items():
+                    f.write(f"  - [{provider.capitalize()}]({os.path.basename(file_path)})\n")
+                f.write("\n")
+            else:
+                f.write(f"- Error: {r.get('error', 'Unknown error')}\n\n")
+    
+    return readme_path
+
+async def run_all_prompts(prompts_dir="prompts", use_cache=True):
     """Run all prompts with multiple LLMs"""
     # Create necessary directories
     ensure_directory("logs")
@@ -550,101 +1008,325 @@ async def run_all_prompts(prompts_dir="prompts"):
     print(f"Starting multi-LLM batch analysis with {len(prompt_files)} prompt templates")
     print(f"Results will be saved to {batch_dir}")
     
-    # Track results for summary
-    results = []
+    # Run several prompts at once; each one mostly waits on the vector DB and provider APIs
+    concurrency = max(1, int(os.getenv("BATCH_CONCURRENCY", "4")))
+    semaphore = asyncio.Semaphore(concurrency)
+    logger.info(f"Running up to {concurrency} prompts concurrently")
     
-    # Process each prompt
-    for i, prompt_file in enumerate(sorted(prompt_files), 1):
+    async def run_prompt(i, prompt_file, session):
+        """Run one prompt and return its summary entry"""
         prompt_path = os.path.join(prompts_dir, prompt_file)
         output_name = f"multi_llm_{prompt_file.replace('.txt', '')}"
         
-        logger.info(f"[{i}/{len(prompt_files)}] Running multi-LLM analysis with {prompt_file}...")
-        print(f"\n[{i}/{len(prompt_files)}] Running multi-LLM analysis with {prompt_file}...")
-        
         # Load the prompt
         prompt_template = load_prompt_from_file(prompt_path)
         if not prompt_template:
             logger.error(f"Failed to load prompt from {prompt_path}")
-            results.append({
+            return {
                 "prompt": prompt_file,
                 "status": "Failed",
                 "error": "Failed to load prompt"
-            })
-            continue
+            }
         
-        # Query the vector database
-        try:
-            output_files = await query_vector_database(
-                prompt_template=prompt_template,
-                output_dir=batch_dir,
-                output_name=output_name
-            )
+        async with semaphore:
+            logger.info(f"[{i}/{len(prompt_files)}] Running multi-LLM analysis with {prompt_file}...")
+            print(f"\n[{i}/{len(prompt_files)}] Running multi-LLM analysis with {prompt_file}...")
             
-            if output_files:
-                results.append({
-                    "prompt": prompt_file,
-                    "status": "Success",
-                    "outputs": output_files
-                })
-            else:
-                logger.warning(f"No output files returned for {prompt_file}")
-                results.append({
+            # Query the vector database
+            try:
+                output_files = await query_vector_database(
+                    prompt_template=prompt_template,
+                    output_dir=batch_dir,
+                    output_name=output_name,
+                    session=session,
+                    use_cache=use_cache
+                )
+            except Exception as e:
+                logger.error(f"Error processing {prompt_file}: {e}", exc_info=True)
+                return {
                     "prompt": prompt_file,
                     "status": "Failed",
-                    "error": "No output files returned"
-                })
-        except Exception as e:
-            logger.error(f"Error processing {prompt_file}: {e}", exc_info=True)
-            results.append({
+                    "error": str(e)
+                }
+        
+        if not output_files:
+            logger.warning(f"No output files returned for {prompt_file}")
+            return {
                 "prompt": prompt_file,
                 "status": "Failed",
-                "error": str(e)
-            })
-        
-        # Small delay to avoid rate limiting
-        if i < len(prompt_files):
-            delay = int(os.getenv("BATCH_DELAY_SECONDS", "5"))
-            logger.info(f"Waiting {delay} seconds before next prompt...")
-            print(f"Completed. Waiting {delay} seconds before next prompt...")
-            await asyncio.sleep(delay)
+                "error": "No output files returned"
+            }
+        return {
+            "prompt": prompt_file,
+            "status": "Success",
+            "outputs": output_files
+        }
+    
+    # Share one connection pool across every prompt in the batch; results keep the prompt order
+    async with get_session() as session:
+        results = await asyncio.gather(*(
+            run_prompt(i, prompt_file, session)
+            for i, prompt_file in enumerate(sorted(prompt_files), 1)
+        ))
     
     # Create a README for the batch run
-    readme_path = os.path.join(batch_dir, "README.md")
-    with open(readme_path, "w", encoding="utf-8") as f:
-        f.write(f"# Multi-LLM Combined Vector Analysis Batch Run\n\n")
-        f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write(f"This batch run analyzed data using multiple LLM providers:\n")
-        f.write(f"- OpenAI (GPT-4o or similar)\n")
-        f.write(f"- Anthropic (Claude 3 Opus or similar)\n")
-        f.write(f"- Google Gemini API\n\n")
-        
-        f.write(f"## Summary\n\n")
-        f.write(f"- Total prompts processed: {len(prompt_files)}\n")
-        f.write(f"- Successful: {sum(1 for r in results if r['status'] == 'Success')}\n")
-        f.write(f"- Failed: {sum(1 for r in results if r['status'] == 'Failed')}\n\n")
-        
-        f.write("## Results\n\n")
-        for r in results:
-            prompt_name = r['prompt'].replace('.txt', '')
-            f.write(f"### {prompt_name}\n\n")
-            f.write(f"- Status: {r['status']}\n")
-            if r['status'] == 'Success':
-                f.write(f"- Comparison: [{os.path.basename(r['outputs']['comparison'])}]({os.path.basename(r['outputs']['comparison'])})\n")
-                f.write(f"- Full JSON: [{os.path.basename(r['outputs']['json'])}]({os.path.basename(r['outputs']['json'])})\n")
-                f.write(f"- Individual analyses:\n")
-                for provider, file_path in r['outputs']['text_files'].items():
-                    f.write(f"  - [{provider.capitalize()}]({os.path.basename(file_path)})\n")
-                f.write("\n")
-            else:
-                f.write(f"- Error: {r.get('error', 'Unknown error')}\n\n")
+    readme_path = write_batch_readme(batch_dir, results)
     
     logger.info(f"Multi-LLM batch processing complete!")
     print(f"\nMulti-LLM batch processing complete!")
     print(f"Results are saved in: {os.path.abspath(batch_dir)}")
     print(f"Summary available in: {os.path.abspath(readme_path)}")
 
-def main():
-    """Parse command line arguments and run the query"""
+async def batch_api_request(session, method, url, as_text=False, **kwargs):
+    """Make one Batch API call, returning the decoded JSON reply (or raw text with as_text)"""
+    async with session.request(method, url, **kwargs) as response:
+        body = await response.text()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} from {url}: {body[:200]}")
+    return body if as_text else orjson.loads(body)
+
+async def poll_batch(session, url, headers, is_done, provider):
+    """
+    Poll a submitted batch until is_done says it has finished, returning its final state
+    Checks quickly at first, then backs off to every BATCH_API_POLL_SECONDS.
+    """
+    max_delay = float(os.getenv("BATCH_API_POLL_SECONDS", "60"))
+    delay = min(5.0, max_delay)
+    while True:
+        try:
+            batch = await batch_api_request(session, "GET", url, headers=headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Error polling {provider} batch, retrying: {e}")
+        else:
+            if is_done(batch):
+                return batch
+            logger.info(f"{provider} batch {batch['id']} is {batch.get('status') or batch.get('processing_status')}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+async def run_openai_batch(session, user_messages, system_prompt):
+    """
+    Run one chat completion per custom ID in user_messages through the OpenAI Batch API
+    Returns {custom_id: analysis}, with an error message for requests that didn't complete.
+    """
+    headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}
+    model = get_model("openai")
+    
+    # Upload the requests as a JSONL file, one chat completion per prompt
+    requests = b"\n".join(orjson.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 4000
+        }
+    }) for custom_id, user_message in user_messages.items())
+    form = aiohttp.FormData()
+    form.add_field("purpose", "batch")
+    form.add_field("file", requests, filename="batch_requests.jsonl", content_type="application/jsonl")
+    upload = await batch_api_request(session, "POST", "https://api.openai.com/v1/files", headers=headers, data=form)
+    
+    batch = await batch_api_request(session, "POST", "https://api.openai.com/v1/batches", headers=headers, json={
+        "input_file_id": upload["id"],
+        "endpoint": "/v1/chat/completions",
+        "completion_window": "24h"
+    })
+    logger.info(f"Submitted OpenAI batch {batch['id']} with {len(user_messages)} requests using {model}")
+    
+    batch = await poll_batch(session, f"https://api.openai.com/v1/batches/{batch['id']}", headers,
+                             lambda batch: batch["status"] in ("completed", "failed", "expired", "cancelled"), "OpenAI")
+    logger.info(f"OpenAI batch {batch['id']} {batch['status']}")
+    
+    # Expired or cancelled batches still return whatever finished in time
+    analyses = {custom_id: f"Error generating OpenAI analysis: batch {batch['status']}" for custom_id in user_messages}
+    for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+        if not file_id:
+            continue
+        content = await batch_api_request(session, "GET", f"https://api.openai.com/v1/files/{file_id}/content",
+                                          as_text=True, headers=headers)
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                analyses[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+            else:
+                error = record.get("error") or response.get("body", {}).get("error") or {}
+                analyses[record["custom_id"]] = f"Error generating OpenAI analysis: {error.get('message', error)}"
+    return analyses
+
+async def run_anthropic_batch(session, user_messages, system_prompt):
+    """
+    Run one message per custom ID in user_messages through the Anthropic Message Batches API
+    Returns {custom_id: analysis}, with an error message for requests that didn't succeed.
+    """
+    headers = {
+        "x-api-key": os.getenv("ANTHROPIC_API_KEY"),
+        "anthropic-version": os.getenv("ANTHROPIC_API_VERSION", "2023-06-01")
+    }
+    model = get_model("anthropic")
+    
+    batch = await batch_api_request(session, "POST", "https://api.anthropic.com/v1/messages/batches", headers=headers, json={
+        "requests": [{
+            "custom_id": custom_id,
+            "params": {
+                "model": model,
+                "max_tokens": 4000,
+                "system": system_prompt,
+                "messages": [
+                    {"role": "user", "content": user_message}
+                ]
+            }
+        } for custom_id, user_message in user_messages.items()]
+    })
+    logger.info(f"Submitted Anthropic batch {batch['id']} with {len(user_messages)} requests using {model}")
+    
+    batch = await poll_batch(session, f"https://api.anthropic.com/v1/messages/batches/{batch['id']}", headers,
+                             lambda batch: batch["processing_status"] == "ended", "Anthropic")
+    logger.info(f"Anthropic batch {batch['id']} ended")
+    
+    analyses = {custom_id: "Error generating Anthropic analysis: no batch result" for custom_id in user_messages}
+    if not batch.get("results_url"):
+        return analyses
+    content = await batch_api_request(session, "GET", batch["results_url"], as_text=True, headers=headers)
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        result = record["result"]
+        if result["type"] == "succeeded":
+            analyses[record["custom_id"]] = "".join(
+                block.get("text", "") for block in result["message"]["content"] if block.get("type") == "text"
+            )
+        else:
+            analyses[record["custom_id"]] = f"Error generating Anthropic analysis: {result.get('error') or result['type']}"
+    return analyses
+
+async def run_all_prompts_batch_api(prompts_dir="prompts", k=30, providers=None):
+    """
+    Run all prompts through the OpenAI and Anthropic Batch APIs instead of one request per prompt
+    Batches are billed at half price but can take up to 24 hours, so this suits sweeps that don't
+    need answers right away. Gemini analyses are requested directly, as there's no batch route for them here.
+    """
+    # Default to all providers if none specified
+    if providers is None:
+        providers = ["openai", "anthropic", "gemini"]
+    providers = [provider for provider in PROVIDER_MODELS if provider in providers]
+    if not providers:
+        logger.error("No valid providers selected")
+        return
+    
+    # Create a timestamp for this batch run
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    batch_dir = f"outputs/multi_llm_batch_{timestamp}"
+    ensure_directory(batch_dir)
+    
+    # Get list of all prompt files
+    if not os.path.exists(prompts_dir):
+        logger.error(f"Prompts directory '{prompts_dir}' not found")
+        return
+    
+    prompt_files = sorted(f for f in os.listdir(prompts_dir) if f.endswith('.txt'))
+    if not prompt_files:
+        logger.error(f"No prompt files found in '{prompts_dir}'")
+        return
+    
+    if not load_environment():
+        return
+    db_path = os.getenv("VECTOR_DB_PATH")
+    if not os.path.exists(db_path):
+        logger.error(f"Vector database directory '{db_path}' not found")
+        return
+    
+    logger.info(f"Starting Batch API analysis with {len(prompt_files)} prompt templates")
+    print(f"Starting Batch API analysis with {len(prompt_files)} prompt templates")
+    print(f"Results will be saved to {batch_dir}")
+    
+    embedding_function = get_embedding_function(os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    get_client(db_path)
+    
+    # Every request has to be in the batch when it's submitted, so retrieve context for all prompts first
+    prompt_templates = [load_prompt_from_file(os.path.join(prompts_dir, prompt_file)) for prompt_file in prompt_files]
+    contexts = await asyncio.gather(*(
+        build_user_message(prompt_template, k, db_path, embedding_function)
+        for prompt_template in prompt_templates if prompt_template
+    ), return_exceptions=True)
+    contexts = iter(contexts)
+    
+    # Summary entry for each prompt file, and the prompts to send keyed by batch custom ID
+    summaries = {}
+    prompts = {}
+    for i, (prompt_file, prompt_template) in enumerate(zip(prompt_files, prompt_templates)):
+        context = next(contexts) if prompt_template else None
+        if isinstance(context, Exception):
+            logger.error(f"Error retrieving context for {prompt_file}: {context}")
+            summaries[prompt_file] = {"prompt": prompt_file, "status": "Failed", "error": str(context)}
+        elif context is None:
+            summaries[prompt_file] = {"prompt": prompt_file, "status": "Failed", "error": "Failed to load prompt or retrieve context"}
+        else:
+            # Batch custom IDs are limited to 64 letters, digits, '_' and '-'
+            custom_id = f"{i}_{prompt_file[:-4].translate(SAFE_NAME_TABLE)}"[:64]
+            prompts[custom_id] = (prompt_file, prompt_template, context)
+    
+    user_messages = {custom_id: context[0] for custom_id, (_, _, context) in prompts.items()}
+    
+    async def query_gemini_each(session, user_messages, system_prompt):
+        """Query Gemini directly for each prompt, returning {custom_id: analysis}"""
+        analyses = await asyncio.gather(*(
+            query_gemini(session, orjson.dumps(user_message), system_prompt)
+            for user_message in user_messages.values()
+        ))
+        return dict(zip(user_messages, analyses))
+    
+    provider_functions = {
+        "openai": run_openai_batch,
+        "anthropic": run_anthropic_batch,
+        "gemini": query_gemini_each
+    }
+    
+    # Submit every provider's batch at once and wait for them all to finish
+    async with get_session() as session:
+        provider_analyses = await asyncio.gather(*(
+            provider_functions[provider](session, user_messages, ANALYSIS_SYSTEM_PROMPT) for provider in providers
+        ), return_exceptions=True) if user_messages else []
+    
+    for provider, analyses in zip(providers, provider_analyses):
+        if isinstance(analyses, Exception):
+            logger.error(f"{provider} batch failed: {analyses}")
+    
+    # Save each prompt's analyses the same way as a regular batch run
+    for custom_id, (prompt_file, prompt_template, (_, top_results, _)) in prompts.items():
+        output_base = os.path.join(batch_dir, f"multi_llm_{prompt_file.replace('.txt', '')}_{timestamp}")
+        analyses = {}
+        output_files = {}
+        for provider, provider_results in zip(providers, provider_analyses):
+            if isinstance(provider_results, Exception):
+                analyses[provider] = f"Error: {str(provider_results)}"
+            else:
+                analyses[provider] = provider_results[custom_id]
+            output_files[provider] = f"{output_base}_{provider}.txt"
+            await write_output(output_files[provider], analyses[provider])
+        
+        outputs = await save_combined_results(output_base, prompt_template, analyses, output_files, top_results)
+        summaries[prompt_file] = {"prompt": prompt_file, "status": "Success", "outputs": outputs}
+    
+    # Create a README for the batch run
+    readme_path = write_batch_readme(batch_dir, [summaries[prompt_file] for prompt_file in prompt_files])
+    
+    logger.info(f"Batch API processing complete!")
+    print(f"\nBatch API processing complete!")
+    print(f"Results are saved in: {os.path.abspath(batch_dir)}")
+    print(f"Summary available in: {os.path.abspath(readme_path)}")
+
+def main(argv=None):
+    """Parse command line arguments and run the query, returning True on success"""
     parser = argparse.ArgumentParser(description='Multi-LLM Combined Vector Database Analyzer')
     parser.add_argument('--prompt', type=str, help='Path to the prompt template file')
     parser.add_argument('--k', type=int, default=30, help='Number of documents to retrieve from each source (default: 30)')
@@ -653,7 +1335,18 @@ def main():
     parser.add_argument('--batch', action='store_true', help='Run all prompts in batch mode')
     parser.add_argument('--prompts-dir', type=str, default='prompts', help='Directory containing prompt templates')
     parser.add_argument('--providers', type=str, help='Comma-separated list of LLM providers to use (options: openai,anthropic,gemini)')
-    args = parser.parse_args()
+    parser.add_argument('--no-cache', action='store_true', help='Always query the LLM providers instead of reusing cached analyses of similar prompts')
+    parser.add_argument('--batch-api', action='store_true', help='Run all prompts through the OpenAI and Anthropic Batch APIs (half price, results within 24 hours)')
+    parser.add_argument('--concurrency', type=int, help='Maximum in-flight requests per provider (overrides the *_CONCURRENCY settings)')
+    parser.add_argument('--rpm', type=int, help='Maximum requests per minute per provider (overrides the *_RPM settings)')
+    args = parser.parse_args(argv)
+    setup_script_logging(logger, "multi_llm_combined")
+    
+    # Command line limits take precedence over every provider's .env settings
+    for limit, settings in ((args.concurrency, PROVIDER_CONCURRENCY), (args.rpm, PROVIDER_RPM)):
+        if limit:
+            for env_var, _ in settings.values():
+                os.environ[env_var] = str(limit)
     
     # Create logs directory if it doesn't exist
     ensure_directory("logs")
@@ -669,40 +1362,48 @@ def main():
             print("\nUse with: python multi_llm_combined_analyzer.py --prompt prompts/template_name.txt")
         else:
             print("Prompts directory not found.")
-        return
+            return False
+        return True
+    
+    # Parse providers if specified
+    providers = None
+    if args.providers:
+        providers = [p.strip() for p in args.providers.split(',')]
+        logger.info(f"Using specified providers: {providers}")
+    
+    # Run the prompts through the providers' Batch APIs if requested
+    if args.batch_api:
+        asyncio.run(run_all_prompts_batch_api(args.prompts_dir, k=args.k, providers=providers))
+        return True
     
     # Run batch mode if requested
     if args.batch:
-        asyncio.run(run_all_prompts(args.prompts_dir))
-        return
+        asyncio.run(run_all_prompts(args.prompts_dir, use_cache=not args.no_cache))
+        return True
     
     # Check if a prompt was specified
     if not args.prompt:
         parser.print_help()
-        return
+        return False
     
     # Check if the prompt file exists
     if not os.path.exists(args.prompt):
         logger.error(f"Prompt file {args.prompt} not found")
-        return
+        return False
     
     # Load the prompt template
     prompt_template = load_prompt_from_file(args.prompt)
     if not prompt_template:
-        return
-    
-    # Parse providers if specified
-    providers = None
-    if args.providers:
-        providers = [p.strip() for p in args.providers.split(',')]
-        logger.info(f"Using specified providers: {providers}")
+        return False
     
     # Query the vector database
-    asyncio.run(query_vector_database(
+    result = asyncio.run(query_vector_database(
         prompt_template=prompt_template,
         k=args.k,
-        output_name=args.output
+        output_name=args.output,
+        use_cache=not args.no_cache
     ))
+    return result is not None
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(0 if main() else 1)
@@ -5,38 +5,151 @@ Demo script to showcase the ChatDoc-InsightMiner-PromptLab
 
 import os
 import sys
+import json
+import hashlib
+import platform
+import shlex
+import shutil
 import subprocess
 import time
 import argparse
+import importlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Records the last successful setup verification so repeat runs can skip it
+VERIFY_CACHE_PATH = ".verify_cache.json"
+
 def print_header(text):
     """Print a section header"""
     print("\n" + "=" * 80)
     print(f" {text}")
     print("=" * 80)
 
-def run_command(command, description):
-    """Run a shell command and print its output"""
+def run_command(argv, description):
+    """Run a command (an argument list, executed without a shell), streaming its output as it runs"""
     print_header(description)
-    print(f"Running: {command}\n")
+    print(f"Running: {shlex.join(argv)}\n")
+    # The child writes straight to our stdout/stderr, so flush what we've printed first
+    sys.stdout.flush()
     try:
-        result = subprocess.run(command, shell=True, check=True, 
-                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                              universal_newlines=True)
-        print(result.stdout)
+        subprocess.run(argv, check=True)
         return True
     except subprocess.CalledProcessError as e:
         print(f"Error running command: {e}")
-        print(e.stdout)
+        return False
+    except OSError as e:
+        # Without a shell in between, a missing or non-executable program raises instead
+        print(f"Error running command: {e}")
+        return False
+
+def verify_cache_key():
+    """Hash the inputs that decide whether a previous setup verification still holds"""
+    digest = hashlib.blake2b()
+    for path in ("requirements.txt", "scripts/verify_setup.sh"):
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+    digest.update(sys.version.encode())
+    digest.update(platform.platform().encode())
+    return digest.hexdigest()
+
+def setup_verified(cache_key):
+    """Check whether the setup was already verified for this environment"""
+    try:
+        with open(VERIFY_CACHE_PATH, "r") as f:
+            return json.load(f).get("key") == cache_key
+    except (OSError, ValueError, AttributeError):
+        return False
+
+def record_setup_verified(cache_key):
+    """Remember a successful setup verification for this environment"""
+    try:
+        with open(VERIFY_CACHE_PATH, "w") as f:
+            json.dump({"key": cache_key, "verified_at": datetime.now().isoformat()}, f)
+    except OSError as e:
+        print(f"Warning: could not write {VERIFY_CACHE_PATH}: {e}")
+
+def run_stage(module_name, argv, description):
+    """Run a pipeline script's main() in this process so imports and loaded models are shared between stages"""
+    print_header(description)
+    print(f"Running: {shlex.join(['scripts/' + module_name + '.py', *argv])}\n")
+    try:
+        # Imported on first use, so steps that are skipped never load their dependencies
+        module = importlib.import_module(module_name)
+        return bool(module.main(argv))
+    except SystemExit as e:
+        # argparse exits on bad arguments; report that as a failed stage instead of ending the demo
+        print(f"Error running stage: exited with status {e.code}")
+        return False
+    except Exception as e:
+        print(f"Error running stage: {e}")
         return False
 
+def chat_collection_has_data():
+    """Check whether the chat collection already holds documents, in which case build_vector_db asks whether to rebuild it"""
+    from dotenv import load_dotenv
+    from vector_db_utils import get_chroma_client
+    
+    load_dotenv()
+    db_path = os.getenv("VECTOR_DB_PATH", "./vector_db")
+    if not os.path.isdir(db_path):
+        return False
+    try:
+        return get_chroma_client(db_path).get_collection(os.getenv("CHAT_COLLECTION_NAME", "chat_messages")).count() > 0
+    except Exception:
+        return False
+
+def build_vector_databases(serial=False):
+    """Build the chat and documentation collections, concurrently unless serial is set"""
+    # The rebuild question can't be answered from a worker thread while the docs stage is logging
+    if not serial and chat_collection_has_data():
+        print("Chat collection already exists; building the databases one after the other so you can choose whether to rebuild it.")
+        serial = True
+    
+    # Parsing docs in worker processes would fork while the chat build's thread is running, so do it in-thread
+    docs_argv = [] if serial else ["--workers", "1"]
+    stages = [
+        ("build_vector_db", [], "Building chat vector database", "Failed to build chat vector database."),
+        ("add_docs_to_vector_db", docs_argv, "Adding documentation to vector database", "Failed to add documentation to vector database."),
+    ]
+    if serial:
+        for module_name, argv, description, failure in stages:
+            if not run_stage(module_name, argv, description):
+                print(failure)
+                return False
+        return True
+    
+    # Import the stages up front, since importing packages such as numpy from two threads at once isn't safe;
+    # a module that fails to import here fails again in run_stage, which reports the error
+    for module_name, _, _, _ in stages:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            pass
+    
+    # The collections are independent, so embed them side by side; threads rather than processes
+    # share one embedding model and one Chroma client, which the local database needs; encode calls on the
+    # shared model take turns, while parsing, hashing and inserts overlap
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        futures = [executor.submit(run_stage, module_name, argv, description) for module_name, argv, description, _ in stages]
+    succeeded = True
+    for (_, _, _, failure), future in zip(stages, futures):
+        if not future.result():
+            print(failure)
+            succeeded = False
+    return succeeded
+
 def main():
     """Run a complete demo of the MultiSource-TriLLM-Toolkit"""
     parser = argparse.ArgumentParser(description="Run a demo of the MultiSource-TriLLM-Toolkit")
     parser.add_argument('--skip-setup', action='store_true', help="Skip setup steps (use if already set up)")
     parser.add_argument('--prompt', type=str, default="analysis_prompts/technical_issues.txt", 
                         help="Prompt to use for the demo (default: analysis_prompts/technical_issues.txt)")
+    parser.add_argument('--serial', action='store_true',
+                        help="Build the chat and documentation databases one after the other (e.g. to limit GPU memory use)")
     
     args = parser.parse_args()
     
@@ -46,6 +159,8 @@ def main():
     # Ensure we're in the right directory
     script_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(os.path.dirname(script_dir))  # Go to parent directory
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)  # Stage modules use flat imports, as when run as scripts
     
     print_header("MultiSource-TriLLM-Toolkit Demo")
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -58,17 +173,24 @@ def main():
             print("Error: verify_setup.sh not found. Are you in the correct directory?")
             return False
         
-        os.chmod("scripts/verify_setup.sh", 0o755)  # Make executable
-        if not run_command("scripts/verify_setup.sh", "Verifying environment setup"):
-            print("Setup verification failed. Please fix the issues and try again.")
-            return False
+        cache_key = verify_cache_key()
+        if setup_verified(cache_key):
+            print(f"Environment verified (cached). Delete {VERIFY_CACHE_PATH} to re-run the checks.")
+        else:
+            # Make executable, unless it already is
+            mode = os.stat("scripts/verify_setup.sh").st_mode
+            if mode & 0o111 != 0o111:
+                os.chmod("scripts/verify_setup.sh", mode | 0o755)
+            if not run_command(["scripts/verify_setup.sh"], "Verifying environment setup"):
+                print("Setup verification failed. Please fix the issues and try again.")
+                return False
+            record_setup_verified(cache_key)
     
     # Check for .env file
     if not os.path.exists(".env"):
         print("Warning: .env file not found. Creating from example...")
         if os.path.exists(".env.example"):
-            with open(".env.example", "r") as src, open(".env", "w") as dst:
-                dst.write(src.read())
+            shutil.copyfile(".env.example", ".env")
             print("Created .env file from .env.example. Please edit it to add your API keys.")
         else:
             print("Error: .env.example not found. Please create a .env file with your API keys.")
@@ -76,12 +198,7 @@ def main():
     
     # Build vector databases
     if not args.skip_setup:
-        if not run_command("python scripts/build_vector_db.py", "Building chat vector database"):
-            print("Failed to build chat vector database.")
-            return False
-        
-        if not run_command("python scripts/add_docs_to_vector_db.py", "Adding documentation to vector database"):
-            print("Failed to add documentation to vector database.")
+        if not build_vector_databases(serial=args.serial):
             return False
     
     # Run analysis
@@ -90,8 +207,8 @@ def main():
         print(f"Error: Prompt file {prompt_path} not found.")
         return False
     
-    if not run_command(f"python scripts/multi_llm_combined_analyzer.py --prompt {prompt_path}", 
-                    f"Running analysis with prompt: {args.prompt}"):
+    if not run_stage("multi_llm_combined_analyzer", ["--prompt", prompt_path],
+                     f"Running analysis with prompt: {args.prompt}"):
         print("Analysis failed.")
         return False
     
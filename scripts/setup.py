@@ -7,12 +7,14 @@ It checks for required directories, Python packages, and configuration files.
 """
 
 import os
+import io
 import sys
 import importlib.util
-import subprocess
+import pkgutil
 import shutil
+from functools import lru_cache
+from contextlib import contextmanager, redirect_stdout
 from pathlib import Path
-import re
 
 # ANSI color codes for terminal output
 GREEN = "\033[0;32m"
@@ -21,6 +23,34 @@ YELLOW = "\033[0;33m"
 BLUE = "\033[0;34m"
 NC = "\033[0m"  # No color
 
+# Leave escape codes out of output that isn't going to a terminal
+if not sys.stdout.isatty():
+    GREEN = RED = YELLOW = BLUE = NC = ""
+
+# Project root, one level above this scripts directory
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Directories the toolkit reads from and writes to, relative to the project root
+REQUIRED_DIRS = ("data", "docs", "logs", "outputs", "prompts", "vector_db")
+
+# Colored labels for print_status, formatted once
+STATUS_LABELS = {
+    "OK": f"{GREEN}OK{NC}",
+    "WARNING": f"{YELLOW}WARNING{NC}",
+    "ERROR": f"{RED}ERROR{NC}"
+}
+
+@contextmanager
+def buffered_output():
+    """Collect everything printed in the block and write it to stdout in one call"""
+    buffer = io.StringIO()
+    try:
+        with redirect_stdout(buffer):
+            yield
+    finally:
+        sys.stdout.write(buffer.getvalue())
+        sys.stdout.flush()
+
 def print_header(text):
     """Print a section header"""
     print(f"\n{BLUE}{'=' * 60}{NC}")
@@ -29,22 +59,12 @@ def print_header(text):
 
 def print_status(label, status, message=None):
     """Print a status message with color"""
-    if status == "OK":
-        status_str = f"{GREEN}OK{NC}"
-    elif status == "WARNING":
-        status_str = f"{YELLOW}WARNING{NC}"
-    elif status == "ERROR":
-        status_str = f"{RED}ERROR{NC}"
-    else:
-        status_str = status
-    
-    print(f"{label:40} {status_str}")
+    print(f"{label:40} {STATUS_LABELS.get(status, status)}")
     if message:
         print(f"  {message}")
 
 def check_python_version():
     """Check if the Python version is supported"""
-    import sys
     version = sys.version_info
     min_version = (3, 9)
     
@@ -56,12 +76,22 @@ def check_python_version():
         print_status("Python version", "OK", f"Python {version.major}.{version.minor}.{version.micro}")
         return True
 
+@lru_cache(maxsize=1)
+def installed_top_level_modules():
+    """Return the names of all importable top-level modules, found with one scan of sys.path"""
+    return frozenset(module.name for module in pkgutil.iter_modules()) | frozenset(sys.builtin_module_names)
+
+@lru_cache(maxsize=None)
 def check_package(package_name):
-    """Check if a Python package is installed"""
-    spec = importlib.util.find_spec(package_name)
-    if spec is None:
+    """Check if a Python package is installed without importing it"""
+    if "." not in package_name:
+        return package_name in installed_top_level_modules()
+    # Namespace packages such as google aren't listed by iter_modules, so locate the submodule directly;
+    # this imports only the lightweight parent package, not the submodule itself
+    try:
+        return importlib.util.find_spec(package_name) is not None
+    except ImportError:
         return False
-    return True
 
 def check_required_packages():
     """Check for required Python packages"""
@@ -85,20 +115,8 @@ def check_required_packages():
     
     for package in required_packages:
         try:
-            # Special handling for modules with different import names
-            if package == "dotenv":
-                import_name = "dotenv"
-                module_check = check_package("dotenv")
-            elif package == "google.generativeai":
-                import_name = "google.generativeai"
-                try:
-                    import google.generativeai
-                    module_check = True
-                except ImportError:
-                    module_check = False
-            else:
-                import_name = package
-                module_check = check_package(package)
+            import_name = package
+            module_check = check_package(package)
                 
             if module_check:
                 print_status(f"Package: {import_name}", "OK")
@@ -118,43 +136,42 @@ def check_required_packages():
 
 def check_directories():
     """Check for required directories and create them if missing"""
-    required_dirs = ["data", "docs", "logs", "outputs", "prompts", "vector_db"]
-    root_dir = Path(__file__).parent.parent
-    
-    for dirname in required_dirs:
-        dir_path = root_dir / dirname
-        if dir_path.exists():
+    for dirname in REQUIRED_DIRS:
+        # mkdir reports an existing directory itself, so there's no need to stat first
+        try:
+            (ROOT_DIR / dirname).mkdir(parents=True)
+        except FileExistsError:
             print_status(f"Directory: {dirname}", "OK")
         else:
-            print_status(f"Directory: {dirname}", "WARNING", "Creating directory")
-            dir_path.mkdir(parents=True, exist_ok=True)
+            print_status(f"Directory: {dirname}", "WARNING", "Created missing directory")
 
 def check_env_file():
     """Check for .env file and create from .env.example if missing"""
-    root_dir = Path(__file__).parent.parent
-    env_path = root_dir / ".env"
-    env_example_path = root_dir / ".env.example"
+    env_path = ROOT_DIR / ".env"
+    env_example_path = ROOT_DIR / ".env.example"
     
     if env_path.exists():
         print_status("Config: .env file", "OK")
         # Check if API keys are set
-        with open(env_path, "r") as f:
-            env_content = f.read()
-            
-        # Check for API keys
-        api_keys = {
-            "OPENAI_API_KEY": re.search(r'OPENAI_API_KEY\s*=\s*([^\s]+)', env_content),
-            "ANTHROPIC_API_KEY": re.search(r'ANTHROPIC_API_KEY\s*=\s*([^\s]+)', env_content),
-            "GEMINI_API_KEY": re.search(r'GEMINI_API_KEY\s*=\s*([^\s]+)', env_content)
-        }
+        env_content = env_path.read_text(encoding="utf-8")
+        
+        # Parse KEY=value lines in a single pass, skipping comments
+        env_values = {}
+        for line in env_content.splitlines():
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                key, value = line.split("=", 1)
+                env_values[key.strip()] = value.strip()
         
         missing_keys = []
         default_keys = []
         
-        for key, match in api_keys.items():
-            if not match:
+        # Check for API keys
+        for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GEMINI_API_KEY"):
+            value = env_values.get(key)
+            if value is None:
                 missing_keys.append(key)
-            elif "your_" in match.group(1) or match.group(1) == "":
+            elif value.startswith("your_") or value == "":
                 default_keys.append(key)
         
         if missing_keys:
@@ -166,7 +183,7 @@ def check_env_file():
             
     elif env_example_path.exists():
         print_status("Config: .env file", "WARNING", "Creating .env from .env.example")
-        shutil.copy(env_example_path, env_path)
+        shutil.copyfile(env_example_path, env_path)
         print(f"\n{YELLOW}Please edit the .env file to add your API keys.{NC}")
     else:
         print_status("Config: .env file", "ERROR", "Neither .env nor .env.example found")
@@ -184,23 +201,34 @@ DOCS_COLLECTION_NAME=documentation
 """)
         print(f"\n{YELLOW}Created a basic .env file. Please edit it to add your API keys.{NC}")
 
+def count_doc_files(path):
+    """Count .md and .mdx files under path in a single recursive scan"""
+    count = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    count += count_doc_files(entry.path)
+                elif entry.name.endswith(('.md', '.mdx')):
+                    count += 1
+    except OSError:
+        pass
+    return count
+
 def check_sample_data():
     """Check for sample data files"""
-    root_dir = Path(__file__).parent.parent
-    
     # Check for chat data
-    chat_data_path = root_dir / "data" / "chat_data.csv"
+    chat_data_path = ROOT_DIR / "data" / "chat_data.csv"
     if chat_data_path.exists():
         print_status("Sample data: chat_data.csv", "OK")
     else:
         print_status("Sample data: chat_data.csv", "WARNING", "No sample chat data found")
     
     # Check for documentation files
-    docs_path = root_dir / "docs"
-    doc_files = list(docs_path.glob("**/*.md")) + list(docs_path.glob("**/*.mdx"))
+    doc_count = count_doc_files(ROOT_DIR / "docs")
     
-    if doc_files:
-        print_status("Sample docs", "OK", f"Found {len(doc_files)} documentation file(s)")
+    if doc_count:
+        print_status("Sample docs", "OK", f"Found {doc_count} documentation file(s)")
     else:
         print_status("Sample docs", "WARNING", "No documentation files found")
 
@@ -216,16 +244,20 @@ def setup_environment():
         return False
     
     # Check and create directories
-    check_directories()
+    with buffered_output():
+        check_directories()
     
     # Check configuration files
-    check_env_file()
+    with buffered_output():
+        check_env_file()
     
     # Check sample data files
-    check_sample_data()
+    with buffered_output():
+        check_sample_data()
     
     # Check required packages
-    packages_ok = check_required_packages()
+    with buffered_output():
+        packages_ok = check_required_packages()
     
     # Display next steps
     print_header("Setup Results")
@@ -15,23 +15,34 @@ import os
 import sys
 import argparse
 import logging
+import logging.handlers
 import json
+import hashlib
 import subprocess
 import time
 import asyncio
+import importlib
 import re
 from datetime import datetime
+from functools import lru_cache
+from types import SimpleNamespace
 from pathlib import Path
 
 # Setup logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+os.makedirs('logs', exist_ok=True)
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Buffer log file writes, flushing every 512 records, on errors, and at exit (via logging.shutdown);
+# the file handler formats records itself, since the buffer passes them through unformatted
+log_file = logging.FileHandler(os.path.join('logs', f'toolkit_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'))
+log_file.setFormatter(logging.Formatter(LOG_FORMAT))
 
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler(os.path.join('logs', f'toolkit_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')),
+        logging.handlers.MemoryHandler(capacity=512, flushLevel=logging.ERROR, target=log_file),
         logging.StreamHandler()
     ]
 )
@@ -44,11 +55,36 @@ YELLOW = "\033[0;33m"
 BLUE = "\033[0;34m"
 NC = "\033[0m"  # No color
 
+# Rule printed above and below section headers
+HEADER_LINE = f"{BLUE}{'=' * 70}{NC}\n"
+
+# Display name and API key variable for each provider
+PROVIDER_KEYS = {
+    "openai": ("OpenAI", "OPENAI_API_KEY"),
+    "anthropic": ("Anthropic", "ANTHROPIC_API_KEY"),
+    "gemini": ("Gemini", "GEMINI_API_KEY")
+}
+
+FALLBACK_SYSTEM_PROMPT = "You are an expert data analyst."
+
+# Options the wizard and demo leave unset when calling the command functions directly
+COMMAND_DEFAULTS = {
+    "csv": None, "docs_dir": None, "collection": None, "force": False,
+    "min_chunk": None, "max_chunk": None,
+    "prompt": None, "k": None, "output": None, "batch": False, "prompts_dir": None, "providers": None
+}
+
+# Fallback replies saved by exact prompt, so re-running an unchanged prompt isn't billed again
+FALLBACK_CACHE_DIR = os.path.join("outputs", ".cache")
+
 def print_header(text):
-    """Print a section header"""
-    print(f"\n{BLUE}{'=' * 70}{NC}")
-    print(f"{BLUE}# {text}{NC}")
-    print(f"{BLUE}{'=' * 70}{NC}")
+    """Print a section header, flushed so it appears ahead of any subprocess output"""
+    sys.stdout.write(f"\n{HEADER_LINE}{BLUE}# {text}{NC}\n{HEADER_LINE}")
+    sys.stdout.flush()
+
+def print_success(message):
+    """Print a success message in green"""
+    print(f"{GREEN}{message}{NC}")
 
 def run_command(command, description):
     """Run a Python module as a subprocess"""
@@ -78,11 +114,55 @@ def run_command(command, description):
             print(e.stdout)
         return False
 
+@lru_cache(maxsize=1)
+def get_env():
+    """
+    Load .env once and return the provider API keys as {variable: value}
+    Call get_env.cache_clear() after changing the keys so the next call sees them.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    return {key_var: os.environ.get(key_var) for _, key_var in PROVIDER_KEYS.values()}
+
+def is_real_key(key):
+    """Return True if an API key is set to something other than the .env.example placeholder"""
+    return bool(key) and not key.startswith("your_")
+
+@lru_cache(maxsize=32)
+def read_prompt_file(prompt_file, mtime):
+    """Read a prompt file; cached per modification time, so an edited file is read again"""
+    return Path(prompt_file).read_text(encoding='utf-8')
+
+def load_prompt(prompt_file):
+    """Return the content of a prompt file, reading it from disk only once while it is unchanged"""
+    return read_prompt_file(prompt_file, os.path.getmtime(prompt_file))
+
+def update_env_file(env_path, updates):
+    """Set the given {variable: value} pairs in a .env file with a single read and write"""
+    with open(env_path, "r") as f:
+        env_lines = f.readlines()
+    
+    remaining = dict(updates)
+    for i, line in enumerate(env_lines):
+        key_name = line.split("=", 1)[0]
+        if "=" in line and key_name in remaining:
+            env_lines[i] = f"{key_name}={remaining.pop(key_name)}\n"
+    
+    # Append keys that weren't in the file yet
+    if env_lines and not env_lines[-1].endswith("\n"):
+        env_lines[-1] += "\n"
+    env_lines.extend(f"{key_name}={key_value}\n" for key_name, key_value in remaining.items())
+    
+    with open(env_path, "w") as f:
+        f.writelines(env_lines)
+
 def ensure_directory(directory):
     """Ensure a directory exists"""
-    if not os.path.exists(directory):
+    try:
         os.makedirs(directory)
         logger.info(f"Created directory: {directory}")
+    except FileExistsError:
+        pass
 
 def check_setup():
     """Check if the environment is properly set up"""
@@ -106,9 +186,39 @@ def check_setup():
         logger.error(f"Setup failed: {e}")
         return False
 
+def run_script(name, argv, isolate=False):
+    """
+    Run one of the toolkit scripts with the given arguments and return True on success
+    The script's main() runs in this process, so heavy imports and loaded embedding models are
+    shared between steps; with isolate it runs in a separate interpreter instead.
+    """
+    if isolate:
+        try:
+            subprocess.run([sys.executable, os.path.join("scripts", f"{name}.py"), *argv], check=True)
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error running {name}: {e}")
+            return False
+    
+    try:
+        result = importlib.import_module(name).main(argv)
+    except SystemExit as e:
+        # argparse exits on invalid arguments
+        return e.code in (None, 0)
+    except Exception as e:
+        logger.error(f"Error running {name}: {e}", exc_info=True)
+        return False
+    
+    # Most scripts return True/False; md_to_csv_converter returns an exit code
+    return result if isinstance(result, bool) else result == 0
+
+def command_args(**overrides):
+    """Return command options for calling a command function directly, with unset options at their defaults"""
+    return SimpleNamespace(**{**COMMAND_DEFAULTS, **overrides})
+
 def build_vector_db(args):
     """Build the chat vector database"""
-    cmd = [sys.executable, "scripts/build_vector_db.py"]
+    cmd = []
     
     if args.csv:
         cmd.extend(["--csv", args.csv])
@@ -116,19 +226,22 @@ def build_vector_db(args):
         cmd.extend(["--collection", args.collection])
     if args.force:
         cmd.append("--force")
+    if getattr(args, "batch_size", None):
+        cmd.extend(["--batch-size", str(args.batch_size)])
+    if getattr(args, "chroma_server", None):
+        cmd.extend(["--chroma-server", args.chroma_server])
     
-    try:
-        result = subprocess.run(cmd, check=True)
-        print(f"{GREEN}Vector database built successfully!{NC}")
+    if run_script("build_vector_db", cmd, getattr(args, "isolate", False)):
+        print_success("Vector database built successfully!")
         return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to build vector database: {e}")
+    else:
+        logger.error("Failed to build vector database")
         print(f"{RED}Failed to build vector database. Check the logs for details.{NC}")
         return False
 
 def add_docs_to_vector_db(args):
     """Add documentation to the vector database"""
-    cmd = [sys.executable, "scripts/add_docs_to_vector_db.py"]
+    cmd = []
     
     if args.docs_dir:
         cmd.extend(["--docs-dir", args.docs_dir])
@@ -140,19 +253,22 @@ def add_docs_to_vector_db(args):
         cmd.extend(["--max-chunk", str(args.max_chunk)])
     if args.force:
         cmd.append("--force")
+    if getattr(args, "batch_size", None):
+        cmd.extend(["--batch-size", str(args.batch_size)])
+    if getattr(args, "chroma_server", None):
+        cmd.extend(["--chroma-server", args.chroma_server])
     
-    try:
-        result = subprocess.run(cmd, check=True)
-        print(f"{GREEN}Documentation added to vector database successfully!{NC}")
+    if run_script("add_docs_to_vector_db", cmd, getattr(args, "isolate", False)):
+        print_success("Documentation added to vector database successfully!")
         return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to add documentation to vector database: {e}")
+    else:
+        logger.error("Failed to add documentation to vector database")
         print(f"{RED}Failed to add documentation to vector database. Check the logs for details.{NC}")
         return False
 
 def run_analyzer(args):
     """Run the multi-LLM combined analyzer"""
-    cmd = [sys.executable, "scripts/multi_llm_combined_analyzer.py"]
+    cmd = []
     
     if args.prompt:
         cmd.extend(["--prompt", args.prompt])
@@ -162,28 +278,89 @@ def run_analyzer(args):
         cmd.extend(["--output", args.output])
     if args.batch:
         cmd.append("--batch")
+    if getattr(args, "batch_api", False):
+        cmd.append("--batch-api")
     if args.prompts_dir:
         cmd.extend(["--prompts-dir", args.prompts_dir])
     if args.providers:
         cmd.extend(["--providers", args.providers])
-    
-    try:
-        result = subprocess.run(cmd, check=True)
+    if getattr(args, "no_cache", False):
+        cmd.append("--no-cache")
+    if getattr(args, "concurrency", None):
+        cmd.extend(["--concurrency", str(args.concurrency)])
+    if getattr(args, "rpm", None):
+        cmd.extend(["--rpm", str(args.rpm)])
+    
+    if run_script("multi_llm_combined_analyzer", cmd, getattr(args, "isolate", False)):
         return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to run analysis: {e}")
+    else:
+        logger.error("Failed to run analysis")
         print(f"{RED}Failed to run analysis. Check the logs for details.{NC}")
         return False
 
-def run_single_llm_fallback(prompt_file, provider):
+async def query_fallback_providers(prompt_content, output_files):
     """
-    Run analysis with a single LLM provider as fallback when not all API keys are available
+    Send a prompt to several providers at once over one shared session
+    Reuses the analyzer's streaming, retrying and rate-limited provider calls; each reply is
+    streamed into its output file as it arrives. Returns {provider: analysis}.
     """
-    print_header(f"Running single-LLM analysis with {provider}")
+    import orjson
+    from multi_llm_combined_analyzer import get_session, query_openai, query_anthropic, query_gemini
+    
+    provider_functions = {
+        "openai": query_openai,
+        "anthropic": query_anthropic,
+        "gemini": query_gemini
+    }
+    
+    # Encode the prompt once for every provider
+    user_message_json = orjson.dumps(prompt_content)
+    
+    async with get_session() as session:
+        results = await asyncio.gather(
+            *(provider_functions[provider](session, user_message_json, FALLBACK_SYSTEM_PROMPT, output_file)
+              for provider, output_file in output_files.items()),
+            return_exceptions=True
+        )
+    return dict(zip(output_files, results))
+
+def fallback_cache_path(provider, prompt_content):
+    """Return the cache file for a provider's reply to a prompt, keyed on the provider, its model and the exact prompt"""
+    from multi_llm_combined_analyzer import get_model
+    
+    prompt_hash = hashlib.sha256(f"{FALLBACK_SYSTEM_PROMPT}\0{prompt_content}".encode("utf-8")).hexdigest()
+    key = hashlib.sha256(f"{provider}\0{get_model(provider)}\0{prompt_hash}".encode("utf-8")).hexdigest()
+    return Path(FALLBACK_CACHE_DIR) / f"{key}.txt"
+
+def run_single_llm_fallback(prompt_file, providers, use_cache=True):
+    """
+    Run analysis with one or more LLM providers as fallback when not all API keys are available
+    The prompt is sent to all selected providers concurrently, with each reply saved to its own file.
+    With use_cache, providers that already answered the identical prompt reuse that reply.
+    """
+    if isinstance(providers, str):
+        providers = [providers]
+    
+    print_header(f"Running single-LLM analysis with {', '.join(providers)}")
+    
+    # Skip providers without an API key
+    env = get_env()
+    ready_providers = []
+    for provider in providers:
+        if provider not in PROVIDER_KEYS:
+            print(f"{RED}Unknown provider: {provider}{NC}")
+            continue
+        name, key_var = PROVIDER_KEYS[provider]
+        if not env[key_var]:
+            print(f"{RED}{name} API key not found in .env file{NC}")
+            continue
+        ready_providers.append(provider)
+    
+    if not ready_providers:
+        return False
     
     # Extract prompt content
-    with open(prompt_file, 'r') as f:
-        prompt_content = f.read()
+    prompt_content = load_prompt(prompt_file)
     
     # Output setup
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -191,129 +368,46 @@ def run_single_llm_fallback(prompt_file, provider):
     ensure_directory(output_dir)
     
     prompt_name = os.path.basename(prompt_file).replace('.txt', '')
-    output_file = os.path.join(output_dir, f"single_llm_{provider}_{prompt_name}_{timestamp}.txt")
+    output_files = {
+        provider: os.path.join(output_dir, f"single_llm_{provider}_{prompt_name}_{timestamp}.txt")
+        for provider in ready_providers
+    }
     
-    # Import specific modules based on provider
-    if provider == "openai":
-        try:
-            import openai
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                print(f"{RED}OpenAI API key not found in .env file{NC}")
-                return False
-                
-            client = openai.OpenAI(api_key=api_key)
-            
-            model = os.getenv("OPENAI_MODEL", "gpt-4o")
-            print(f"Using OpenAI model: {model}")
-            
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are an expert data analyst."},
-                    {"role": "user", "content": prompt_content}
-                ],
-                temperature=0.3,
-                max_tokens=4000
-            )
-            
-            analysis = response.choices[0].message.content
-            
-            with open(output_file, 'w') as f:
-                f.write(analysis)
-                
-            print(f"{GREEN}Analysis complete! Results saved to {output_file}{NC}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error with OpenAI API: {e}")
-            print(f"{RED}Error generating OpenAI analysis: {str(e)}{NC}")
-            return False
-            
-    elif provider == "anthropic":
-        try:
-            import anthropic
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key:
-                print(f"{RED}Anthropic API key not found in .env file{NC}")
-                return False
-                
-            client = anthropic.Anthropic(api_key=api_key)
-            
-            model = os.getenv("ANTHROPIC_MODEL", "claude-3-opus-20240229")
-            print(f"Using Anthropic model: {model}")
-            
-            response = client.messages.create(
-                model=model,
-                max_tokens=4000,
-                system="You are an expert data analyst.",
-                messages=[
-                    {"role": "user", "content": prompt_content}
-                ]
-            )
-            
-            analysis = response.content[0].text
-            
-            with open(output_file, 'w') as f:
-                f.write(analysis)
-                
-            print(f"{GREEN}Analysis complete! Results saved to {output_file}{NC}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error with Anthropic API: {e}")
-            print(f"{RED}Error generating Anthropic analysis: {str(e)}{NC}")
-            return False
-            
-    elif provider == "gemini":
-        try:
-            import google.generativeai as genai
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                print(f"{RED}Gemini API key not found in .env file{NC}")
-                return False
-                
-            genai.configure(api_key=api_key)
-            
-            model_name = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
-            print(f"Using Gemini model: {model_name}")
-            
-            model = genai.GenerativeModel(model_name)
-            
-            response = model.generate_content(
-                contents=[prompt_content],
-                generation_config={
-                    "temperature": 0.3,
-                    "max_output_tokens": 4000,
-                    "top_p": 0.95
-                },
-            )
-            
-            analysis = response.text
-            
-            with open(output_file, 'w') as f:
-                f.write(analysis)
-                
-            print(f"{GREEN}Analysis complete! Results saved to {output_file}{NC}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error with Gemini API: {e}")
-            print(f"{RED}Error generating Gemini analysis: {str(e)}{NC}")
-            return False
+    # Reuse saved replies to this exact prompt instead of calling the provider again
+    results = {}
+    cache_paths = {provider: fallback_cache_path(provider, prompt_content) for provider in ready_providers}
+    if use_cache:
+        for provider, cache_path in cache_paths.items():
+            if cache_path.is_file():
+                results[provider] = cache_path.read_text(encoding="utf-8")
+                logger.info(f"Using cached {provider} analysis from {cache_path}")
     
-    else:
-        print(f"{RED}Unknown provider: {provider}{NC}")
+    try:
+        pending_files = {provider: path for provider, path in output_files.items() if provider not in results}
+        if pending_files:
+            results.update(asyncio.run(query_fallback_providers(prompt_content, pending_files)))
+    except Exception as e:
+        logger.error(f"Error running fallback analysis: {e}")
+        print(f"{RED}Error generating analysis: {str(e)}{NC}")
         return False
+    
+    success = True
+    for provider, analysis in results.items():
+        name = PROVIDER_KEYS[provider][0]
+        if isinstance(analysis, Exception) or analysis.startswith("Error"):
+            logger.error(f"Error with {name} API: {analysis}")
+            print(f"{RED}Error generating {name} analysis: {analysis}{NC}")
+            success = False
+            continue
+        
+        # The reply was streamed into the file; rewrite it with the final text in case the stream was cut short
+        with open(output_files[provider], 'w') as f:
+            f.write(analysis)
+        cache_paths[provider].parent.mkdir(parents=True, exist_ok=True)
+        cache_paths[provider].write_text(analysis, encoding="utf-8")
+        print_success(f"{name} analysis complete! Results saved to {output_files[provider]}")
+    
+    return success
 
 def run_wizard():
     """Run an interactive setup wizard"""
@@ -326,41 +420,27 @@ def run_wizard():
         print(f"{RED}Environment setup failed. Please fix the issues and try again.{NC}")
         return False
     
-    # Check for API keys
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    api_keys = {
-        "OpenAI": os.getenv("OPENAI_API_KEY"),
-        "Anthropic": os.getenv("ANTHROPIC_API_KEY"),
-        "Gemini": os.getenv("GEMINI_API_KEY")
+    # Check for API keys once; the wizard marks providers ready as keys are added
+    env = get_env()
+    provider_ready = {
+        provider: is_real_key(env[key_var])
+        for provider, (_, key_var) in PROVIDER_KEYS.items()
     }
     
-    missing_keys = [name for name, key in api_keys.items() if not key or "your_" in key]
+    missing_keys = [PROVIDER_KEYS[provider][0] for provider, ready in provider_ready.items() if not ready]
     
     if missing_keys:
         print(f"\n{YELLOW}Warning: Missing or default API keys for: {', '.join(missing_keys)}{NC}")
         print("You can continue with limited functionality using fallback mode with a single LLM provider.")
         print("Here are your options based on available API keys:")
         
-        available_providers = []
-        if "OpenAI" not in missing_keys:
-            available_providers.append("openai")
-            print(f"- {GREEN}OpenAI{NC}: Available (use with `fallback --provider openai`)")
-        else:
-            print(f"- {RED}OpenAI{NC}: Not available")
-            
-        if "Anthropic" not in missing_keys:
-            available_providers.append("anthropic")
-            print(f"- {GREEN}Anthropic{NC}: Available (use with `fallback --provider anthropic`)")
-        else:
-            print(f"- {RED}Anthropic{NC}: Not available")
-            
-        if "Gemini" not in missing_keys:
-            available_providers.append("gemini")
-            print(f"- {GREEN}Gemini{NC}: Available (use with `fallback --provider gemini`)")
-        else:
-            print(f"- {RED}Gemini{NC}: Not available")
+        available_providers = [provider for provider, ready in provider_ready.items() if ready]
+        for provider, ready in provider_ready.items():
+            name = PROVIDER_KEYS[provider][0]
+            if ready:
+                print(f"- {GREEN}{name}{NC}: Available (use with `fallback --provider {provider}`)")
+            else:
+                print(f"- {RED}{name}{NC}: Not available")
         
         if not available_providers:
             print(f"\n{RED}No API keys are currently available.{NC}")
@@ -377,69 +457,50 @@ def run_wizard():
                 if os.path.exists(env_example):
                     with open(env_example, "r") as src, open(env_path, "w") as dst:
                         dst.write(src.read())
-                    print(f"{GREEN}Created .env file from .env.example{NC}")
+                    print_success("Created .env file from .env.example")
                 else:
                     with open(env_path, "w") as f:
                         f.write("# API Keys\n")
                         f.write("OPENAI_API_KEY=\n")
                         f.write("ANTHROPIC_API_KEY=\n")
                         f.write("GEMINI_API_KEY=\n")
-                    print(f"{GREEN}Created new .env file{NC}")
+                    print_success("Created new .env file")
             
-            # Helper function to safely update .env file
-            def update_env_key(key_name, key_value):
-                if not key_value.strip():
-                    return False
-                    
-                with open(env_path, "r") as f:
-                    env_lines = f.readlines()
-                
-                key_pattern = f"{key_name}="
-                key_exists = False
-                
-                for i, line in enumerate(env_lines):
-                    if line.startswith(key_pattern):
-                        env_lines[i] = f"{key_name}={key_value}\n"
-                        key_exists = True
-                        break
-                
-                if not key_exists:
-                    env_lines.append(f"{key_name}={key_value}\n")
-                
-                with open(env_path, "w") as f:
-                    f.writelines(env_lines)
-                    
-                return True
+            # Collect the new keys, then write them to .env together
+            updates = {}
             
             if "OpenAI" in missing_keys:
                 print(f"\n{BLUE}For OpenAI:{NC}")
                 print("Get your API key from: https://platform.openai.com/api-keys")
                 openai_key = input("Enter your OpenAI API key (or press Enter to skip): ")
-                if update_env_key("OPENAI_API_KEY", openai_key):
-                    os.environ["OPENAI_API_KEY"] = openai_key
-                    available_providers.append("openai")
+                if openai_key.strip():
+                    updates["OPENAI_API_KEY"] = openai_key.strip()
+                    provider_ready["openai"] = True
             
             if "Anthropic" in missing_keys:
                 print(f"\n{BLUE}For Anthropic:{NC}")
                 print("Get your API key from: https://console.anthropic.com/settings/keys")
                 anthropic_key = input("Enter your Anthropic API key (or press Enter to skip): ")
-                if update_env_key("ANTHROPIC_API_KEY", anthropic_key):
-                    os.environ["ANTHROPIC_API_KEY"] = anthropic_key
-                    available_providers.append("anthropic")
+                if anthropic_key.strip():
+                    updates["ANTHROPIC_API_KEY"] = anthropic_key.strip()
+                    provider_ready["anthropic"] = True
             
             if "Gemini" in missing_keys:
                 print(f"\n{BLUE}For Google Gemini:{NC}")
                 print("Get your API key from: https://aistudio.google.com/app/apikey")
                 gemini_key = input("Enter your Gemini API key (or press Enter to skip): ")
-                if update_env_key("GEMINI_API_KEY", gemini_key):
-                    os.environ["GEMINI_API_KEY"] = gemini_key
-                    available_providers.append("gemini")
+                if gemini_key.strip():
+                    updates["GEMINI_API_KEY"] = gemini_key.strip()
+                    provider_ready["gemini"] = True
+            
+            if updates:
+                update_env_file(env_path, updates)
+                os.environ.update(updates)
             
-            # Remove duplicates
-            available_providers = list(set(available_providers))
+            available_providers = [provider for provider, ready in provider_ready.items() if ready]
             
-            # Reload .env file
-            load_dotenv(override=True)
+            # The new keys are in os.environ, so drop the cached snapshot
+            get_env.cache_clear()
             
             if available_providers:
                 print(f"\n{GREEN}API keys updated. You can now use these providers: {', '.join(available_providers)}{NC}")
@@ -453,7 +514,7 @@ def run_wizard():
     chat_data_path = os.path.join("data", "chat_data.csv")
     
     if os.path.exists(chat_data_path):
-        print(f"{GREEN}Found chat data at {chat_data_path}{NC}")
+        print_success(f"Found chat data at {chat_data_path}")
     else:
         print(f"{YELLOW}No chat data found at {chat_data_path}{NC}")
         print("You need chat data to build the vector database.")
@@ -463,8 +524,8 @@ def run_wizard():
     print("\nStep 3: Building the vector database...")
     answer = input("Would you like to build/rebuild the vector database from chat data? (y/n): ")
     if answer.lower() == 'y':
-        if build_vector_db(argparse.Namespace(csv=None, collection=None, force=False)):
-            print(f"{GREEN}Vector database built successfully!{NC}")
+        if build_vector_db(command_args()):
+            print_success("Vector database built successfully!")
         else:
             print(f"{RED}Failed to build vector database.{NC}")
             return False
@@ -472,16 +533,15 @@ def run_wizard():
     # Check for documentation
     print("\nStep 4: Checking for documentation...")
     docs_dir = "docs"
-    doc_files = list(Path(docs_dir).glob("**/*.md")) + list(Path(docs_dir).glob("**/*.mdx"))
+    doc_files = [path for path in Path(docs_dir).rglob("*.md*") if path.suffix in (".md", ".mdx")]
     
     if doc_files:
-        print(f"{GREEN}Found {len(doc_files)} documentation file(s) in {docs_dir}{NC}")
+        print_success(f"Found {len(doc_files)} documentation file(s) in {docs_dir}")
         
         answer = input("Would you like to add documentation to the vector database? (y/n): ")
         if answer.lower() == 'y':
-            if add_docs_to_vector_db(argparse.Namespace(docs_dir=docs_dir, collection=None, 
-                                                      min_chunk=None, max_chunk=None, force=False)):
-                print(f"{GREEN}Documentation added to vector database successfully!{NC}")
+            if add_docs_to_vector_db(command_args(docs_dir=docs_dir)):
+                print_success("Documentation added to vector database successfully!")
             else:
                 print(f"{RED}Failed to add documentation to vector database.{NC}")
     else:
@@ -493,12 +553,7 @@ def run_wizard():
     prompts_dir = "prompts"
     
     # Check available prompt files
-    all_prompt_files = []
-    for root, dirs, files in os.walk(prompts_dir):
-        for file in files:
-            if file.endswith('.txt'):
-                prompt_path = os.path.join(root, file)
-                all_prompt_files.append(prompt_path)
+    all_prompt_files = sorted(str(path) for path in Path(prompts_dir).rglob("*.txt"))
     
     if all_prompt_files:
         print(f"Available prompt templates:")
@@ -511,34 +566,16 @@ def run_wizard():
                 selected_prompt = all_prompt_files[prompt_index]
                 print(f"Selected: {selected_prompt}")
                 
-                # Check which API keys are available
-                available_providers = []
-                if os.getenv("OPENAI_API_KEY") and "your_" not in os.getenv("OPENAI_API_KEY"):
-                    available_providers.append("openai")
-                if os.getenv("ANTHROPIC_API_KEY") and "your_" not in os.getenv("ANTHROPIC_API_KEY"):
-                    available_providers.append("anthropic")
-                if os.getenv("GEMINI_API_KEY") and "your_" not in os.getenv("GEMINI_API_KEY"):
-                    available_providers.append("gemini")
+                # Use the providers found ready above, including any keys added by the wizard
+                available_providers = [provider for provider, ready in provider_ready.items() if ready]
                 
                 if len(available_providers) >= 3:
                     print("Running multi-LLM analysis with all providers...")
-                    run_analyzer(argparse.Namespace(prompt=selected_prompt, k=30, output=None, 
-                                                 batch=False, prompts_dir=None, providers=None))
+                    run_analyzer(command_args(prompt=selected_prompt, k=30))
                 elif len(available_providers) > 0:
                     print(f"{YELLOW}Not all API keys are available. Using single-LLM fallback mode.{NC}")
-                    provider_options = ", ".join(available_providers)
-                    
-                    if len(available_providers) == 1:
-                        selected_provider = available_providers[0]
-                    else:
-                        provider_input = input(f"Select a provider ({provider_options}): ").lower()
-                        if provider_input in available_providers:
-                            selected_provider = provider_input
-                        else:
-                            selected_provider = available_providers[0]
-                    
-                    print(f"Using {selected_provider} for analysis...")
-                    run_single_llm_fallback(selected_prompt, selected_provider)
+                    print(f"Using {', '.join(available_providers)} for analysis...")
+                    run_single_llm_fallback(selected_prompt, available_providers)
                 else:
                     print(f"{RED}No valid API keys found. Cannot run analysis.{NC}")
                     return False
@@ -581,12 +618,11 @@ def run_demo(args):
     
     # Build vector databases
     if not args.skip_setup:
-        if not build_vector_db(argparse.Namespace(csv=None, collection=None, force=False)):
+        if not build_vector_db(command_args()):
             print("Failed to build chat vector database.")
             return False
         
-        if not add_docs_to_vector_db(argparse.Namespace(docs_dir="docs", collection=None, 
-                                                     min_chunk=None, max_chunk=None, force=False)):
+        if not add_docs_to_vector_db(command_args(docs_dir="docs")):
             print("Failed to add documentation to vector database.")
             return False
     
@@ -596,8 +632,7 @@ def run_demo(args):
         print(f"Error: Prompt file {prompt_path} not found.")
         return False
     
-    if not run_analyzer(argparse.Namespace(prompt=prompt_path, k=None, output=None, 
-                                        batch=False, prompts_dir=None, providers=None)):
+    if not run_analyzer(command_args(prompt=prompt_path)):
         print("Analysis failed.")
         return False
     
@@ -613,19 +648,20 @@ def run_demo(args):
 
 def convert_markdown(args):
     """Convert markdown file(s) to CSV"""
-    cmd = [sys.executable, "scripts/md_to_csv_converter.py"]
+    cmd = []
     
     cmd.extend(["--input"] + args.input)
     cmd.extend(["--output", args.output])
     if args.track_source:
         cmd.append("--track-source")
+    if getattr(args, "assume_sorted", False):
+        cmd.append("--assume-sorted")
     
-    try:
-        result = subprocess.run(cmd, check=True)
-        print(f"{GREEN}Markdown file(s) converted to CSV successfully!{NC}")
+    if run_script("md_to_csv_converter", cmd, getattr(args, "isolate", False)):
+        print_success("Markdown file(s) converted to CSV successfully!")
         return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to convert markdown to CSV: {e}")
+    else:
+        logger.error("Failed to convert markdown to CSV")
         print(f"{RED}Failed to convert markdown to CSV. Check the logs for details.{NC}")
         return False
 
@@ -635,6 +671,8 @@ def main():
         description="ChatDoc-InsightMiner-PromptLab - All-in-one interface",
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
+    parser.add_argument('--isolate', action='store_true',
+                        help="Run each step's script in a separate Python process instead of in-process (useful for debugging)")
     
     subparsers = parser.add_subparsers(dest="command", help="Command to execute")
     
@@ -649,6 +687,8 @@ def main():
     build_parser.add_argument('--csv', type=str, help="Path to CSV file containing chat messages")
     build_parser.add_argument('--collection', type=str, help="Name for the vector database collection")
     build_parser.add_argument('--force', action='store_true', help="Force rebuild if collection already exists")
+    build_parser.add_argument('--batch-size', type=int, help="Number of messages embedded and inserted per batch")
+    build_parser.add_argument('--chroma-server', type=str, help="URL of a Chroma server to use instead of the local database")
     
     # Add docs command
     docs_parser = subparsers.add_parser("docs", help="Add documentation to vector database")
@@ -657,6 +697,8 @@ def main():
     docs_parser.add_argument('--min-chunk', type=int, help="Minimum chunk size in characters")
     docs_parser.add_argument('--max-chunk', type=int, help="Maximum chunk size in characters")
     docs_parser.add_argument('--force', action='store_true', help="Force rebuild if collection already exists")
+    docs_parser.add_argument('--batch-size', type=int, help="Number of chunks embedded and inserted per batch")
+    docs_parser.add_argument('--chroma-server', type=str, help="URL of a Chroma server to use instead of the local database")
     
     # Analyze command
     analyze_parser = subparsers.add_parser("analyze", help="Run multi-LLM analysis")
@@ -666,13 +708,18 @@ def main():
     analyze_parser.add_argument('--batch', action='store_true', help="Run all prompts in batch mode")
     analyze_parser.add_argument('--prompts-dir', type=str, help="Directory containing prompt templates")
     analyze_parser.add_argument('--providers', type=str, help="Comma-separated list of LLM providers to use")
+    analyze_parser.add_argument('--no-cache', action='store_true', help="Always query the LLM providers instead of reusing cached analyses")
+    analyze_parser.add_argument('--batch-api', action='store_true', help="Run all prompts through the OpenAI and Anthropic Batch APIs (half price, results within 24 hours)")
+    analyze_parser.add_argument('--concurrency', type=int, help="Maximum in-flight requests per provider")
+    analyze_parser.add_argument('--rpm', type=int, help="Maximum requests per minute per provider")
     
     # Single-LLM fallback command
     fallback_parser = subparsers.add_parser("fallback", help="Run with a single LLM (fallback mode)")
     fallback_parser.add_argument('--prompt', type=str, required=True, help="Path to the prompt template file")
-    fallback_parser.add_argument('--provider', type=str, required=True, 
+    fallback_parser.add_argument('--provider', type=str, nargs='+', required=True, 
                               choices=["openai", "anthropic", "gemini"],
-                              help="LLM provider to use")
+                              help="LLM provider(s) to use; several are queried concurrently")
+    fallback_parser.add_argument('--no-cache', action='store_true', help="Always query the LLM providers instead of reusing saved replies to the same prompt")
     
     # Markdown to CSV conversion command
     md2csv_parser = subparsers.add_parser("md2csv", help="Convert markdown file(s) to CSV")
@@ -682,6 +729,8 @@ def main():
                              help="Path to output CSV file")
     md2csv_parser.add_argument('--track-source', action='store_true',
                              help="Add source column to CSV to track which file each record came from")
+    md2csv_parser.add_argument('--assume-sorted', action='store_true',
+                             help="Input files are already in chronological order; stream them without sorting")
     
     # Demo command
     demo_parser = subparsers.add_parser("demo", help="Run the demo workflow")
@@ -718,7 +767,7 @@ def main():
     elif args.command == "analyze":
         success = run_analyzer(args)
     elif args.command == "fallback":
-        success = run_single_llm_fallback(args.prompt, args.provider)
+        success = run_single_llm_fallback(args.prompt, args.provider, use_cache=not args.no_cache)
     elif args.command == "md2csv":
         success = convert_markdown(args)
     elif args.command == "demo":
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Markdown chat fixtures shared by the markdown to CSV tests.
+"""
+
+from pathlib import Path
+
+# Fixture file names and their contents
+FIXTURES = {
+    "test.md": """User1 — 12/30/24, 11:16 AM
+Hi all! New here. Just exploring your product.
+
+
+User2 — 12/30/24, 11:50 AM
+Can I do this via the free plan?
+
+
+Support — 1/2/25, 10:32 AM
+@team-member1 Could you answer this? ^""",
+    "test2.md": """User3 — 1/5/25, 1:46 AM
+Hi, I have a question regarding your APIs.
+
+
+User4 — 1/6/25, 2:30 PM
+How do I get started with your SDK?"""
+}
+
+def write_fixtures(directory):
+    """Write the fixture files into directory, returning their paths by file name."""
+    paths = {}
+    for name, content in FIXTURES.items():
+        path = Path(directory) / name
+        path.write_text(content, encoding="utf-8")
+        paths[name] = str(path)
+    return paths
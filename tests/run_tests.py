@@ -4,20 +4,82 @@ Test runner for ChatDoc InsightMiner PromptLab.
 """
 
 import unittest
+import hashlib
+import io
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+def discovery_key(test_dir):
+    """Hash the test file paths and modification times, so any added, removed or edited test invalidates the manifest"""
+    test_files = sorted((str(path), path.stat().st_mtime_ns) for path in Path(test_dir).rglob("test_*.py"))
+    return hashlib.md5(str(test_files).encode()).hexdigest()
+
+def test_module_names(suite):
+    """Yield the name of each module with tests in a discovered suite"""
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from test_module_names(test)
+        else:
+            yield type(test).__module__
+
+def load_suite(loader, test_dir, manifest_path):
+    """
+    Load the test suite, reusing the module list from the last discovery if no test file has changed
+    Discovery results are only saved when every module imported cleanly.
+    """
+    key = discovery_key(test_dir)
+    try:
+        cached_key, *module_names = Path(manifest_path).read_text(encoding="utf-8").splitlines()
+    except (OSError, ValueError):
+        cached_key, module_names = None, []
+    
+    if cached_key == key:
+        sys.path.insert(0, test_dir)
+        return loader.loadTestsFromNames(module_names)
+    
+    suite = loader.discover(test_dir, pattern="test_*.py")
+    if not loader.errors:
+        module_names = list(dict.fromkeys(test_module_names(suite)))
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        Path(manifest_path).write_text("\n".join([key, *module_names]) + "\n", encoding="utf-8")
+    return suite
+
+def run_module(test_dir, module_name):
+    """Run one test module in a worker process, returning its report and whether it passed"""
+    sys.path[:0] = [os.path.dirname(test_dir), test_dir]
+    stream = io.StringIO()
+    suite = unittest.TestLoader().loadTestsFromName(module_name)
+    result = unittest.TextTestRunner(stream=stream, verbosity=2).run(suite)
+    return stream.getvalue(), result.wasSuccessful()
+
+def run_parallel(test_dir, module_names):
+    """Run each test module in its own process, printing the reports in module order"""
+    workers = max(1, min(len(module_names), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        reports = list(pool.map(run_module, repeat(test_dir), module_names))
+    for report, _ in reports:
+        sys.stderr.write(report)
+    return all(passed for _, passed in reports)
 
 def main():
     """Discover and run all tests."""
     # Get the directory containing this script
     test_dir = os.path.dirname(os.path.abspath(__file__))
+    root_dir = os.path.abspath(os.path.join(test_dir, '..'))
     
     # Add the parent directory to sys.path
-    sys.path.insert(0, os.path.abspath(os.path.join(test_dir, '..')))
+    sys.path.insert(0, root_dir)
     
-    # Discover and run tests
+    # Discover and run tests, skipping discovery when the test files are unchanged
     loader = unittest.TestLoader()
-    suite = loader.discover(test_dir, pattern="test_*.py")
+    suite = load_suite(loader, test_dir, os.path.join(root_dir, ".pytest_cache", "test_modules.txt"))
+    
+    # With TEST_PARALLEL=1, run the test modules concurrently; import errors still run serially so they're reported
+    if os.getenv("TEST_PARALLEL") == "1" and not loader.errors:
+        return 0 if run_parallel(test_dir, list(dict.fromkeys(test_module_names(suite)))) else 1
     
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
@@ -26,4 +88,4 @@ def main():
     return 0 if result.wasSuccessful() else 1
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
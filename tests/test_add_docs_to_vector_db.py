@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for reading documentation files before they are chunked.
+"""
+
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+
+# The script imports its helpers by module name, as it does when run from the scripts directory
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# The module loads the embedding stack on import, so skip when it isn't installed
+try:
+    from add_docs_to_vector_db import get_file_content, find_headers
+except ImportError as e:
+    IMPORT_ERROR = str(e)
+else:
+    IMPORT_ERROR = None
+
+MDX_CONTENT = "---\ntitle: Intro\n---\nimport Tabs from '@theme/Tabs';\n# Intro\n\nbody text\n"
+
+@unittest.skipIf(IMPORT_ERROR, f"add_docs_to_vector_db dependencies missing: {IMPORT_ERROR}")
+class TestGetFileContent(unittest.TestCase):
+    """Test cases for loading markdown and MDX files."""
+    
+    def setUp(self):
+        """Create a temporary directory for the fixture files."""
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir)
+    
+    def write_file(self, name, content):
+        """Write content to a fixture file as raw bytes, returning its path."""
+        path = Path(self.test_dir) / name
+        path.write_bytes(content.encode('utf-8'))
+        return path
+    
+    def test_mdx_frontmatter_removed(self):
+        """Test that frontmatter and imports are stripped from an MDX file."""
+        path = self.write_file("intro.mdx", MDX_CONTENT)
+        self.assertEqual(get_file_content(path), "# Intro\n\nbody text\n")
+    
+    def test_crlf_mdx_file(self):
+        """Test that a CRLF MDX file is read like its LF version."""
+        path = self.write_file("intro.mdx", MDX_CONTENT.replace("\n", "\r\n"))
+        content = get_file_content(path)
+        
+        # Check frontmatter and imports are stripped
+        self.assertEqual(content, "# Intro\n\nbody text\n")
+        
+        # Check header titles have no trailing carriage return
+        self.assertEqual([text for _, _, _, text in find_headers(content)], ["Intro"])
+    
+    def test_crlf_markdown_file(self):
+        """Test that CRLF newlines in a markdown file are translated."""
+        path = self.write_file("intro.md", "# Intro\r\n\r\nbody text\r\n")
+        self.assertEqual(get_file_content(path), "# Intro\n\nbody text\n")
+
+if __name__ == '__main__':
+    unittest.main()
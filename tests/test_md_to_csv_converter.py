@@ -11,49 +11,54 @@ import tempfile
 import shutil
 from pathlib import Path
 
-# Add the parent directory to sys.path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Add the parent directory to sys.path, unless the test runner already has
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# Shared fixtures live next to this file
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+if TESTS_DIR not in sys.path:
+    sys.path.insert(0, TESTS_DIR)
 
 # Import the module to test
 from scripts.md_to_csv_converter import convert_markdown_to_csv, convert_multiple_markdown_files, parse_timestamp
+from md_fixtures import write_fixtures
 
 class TestMarkdownToCsvConverter(unittest.TestCase):
     """Test cases for markdown to CSV converter functions."""
     
-    def setUp(self):
-        """Set up test environment."""
-        self.test_dir = tempfile.mkdtemp()
+    @classmethod
+    def setUpClass(cls):
+        """Create the test directory and markdown files once for all tests."""
+        cls.test_dir = tempfile.mkdtemp()
         
         # Create test markdown files
-        self.test_md_file = os.path.join(self.test_dir, "test.md")
-        with open(self.test_md_file, 'w', encoding='utf-8') as f:
-            f.write("""User1 — 12/30/24, 11:16 AM
-Hi all! New here. Just exploring your product.
-
-
-User2 — 12/30/24, 11:50 AM
-Can I do this via the free plan?
-
-
-Support — 1/2/25, 10:32 AM
-@team-member1 Could you answer this? ^""")
-        
-        self.test_md_file2 = os.path.join(self.test_dir, "test2.md")
-        with open(self.test_md_file2, 'w', encoding='utf-8') as f:
-            f.write("""User3 — 1/5/25, 1:46 AM
-Hi, I have a question regarding your APIs.
-
-
-User4 — 1/6/25, 2:30 PM
-How do I get started with your SDK?""")
+        fixtures = write_fixtures(cls.test_dir)
+        cls.test_md_file = fixtures["test.md"]
+        cls.test_md_file2 = fixtures["test2.md"]
         
         # Output files
-        self.output_csv = os.path.join(self.test_dir, "output.csv")
-        self.output_combined_csv = os.path.join(self.test_dir, "combined.csv")
+        cls.output_csv = os.path.join(cls.test_dir, "output.csv")
+        cls.output_combined_csv = os.path.join(cls.test_dir, "combined.csv")
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test environment."""
-        shutil.rmtree(self.test_dir)
+        shutil.rmtree(cls.test_dir)
+    
+    def tearDown(self):
+        """Remove this test's CSV outputs so each test starts without them."""
+        for output_file in (self.output_csv, self.output_combined_csv):
+            if os.path.exists(output_file):
+                os.remove(output_file)
+    
+    def read_csv(self, path):
+        """Read a CSV file, returning its header row and the remaining rows."""
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            headers = next(reader)
+            return headers, list(reader)
     
     def test_parse_timestamp(self):
         """Test timestamp parsing function."""
@@ -78,10 +83,7 @@ How do I get started with your SDK?""")
         self.assertTrue(os.path.exists(self.output_csv))
         
         # Check CSV file content
-        with open(self.output_csv, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            rows = list(reader)
+        headers, rows = self.read_csv(self.output_csv)
         
         # Check headers
         self.assertEqual(headers, ['timestamp', 'username', 'message'])
@@ -90,10 +92,7 @@ How do I get started with your SDK?""")
         self.assertEqual(len(rows), 3)
         
         # Check content of rows
-        usernames = [row[1] for row in rows]
-        self.assertIn('User1', usernames)
-        self.assertIn('User2', usernames)
-        self.assertIn('Support', usernames)
+        self.assertEqual({row[1] for row in rows}, {'User1', 'User2', 'Support'})
     
     def test_multiple_file_conversion(self):
         """Test converting multiple markdown files to a single CSV."""
@@ -109,10 +108,7 @@ How do I get started with your SDK?""")
         self.assertTrue(os.path.exists(self.output_combined_csv))
         
         # Check CSV file content
-        with open(self.output_combined_csv, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            rows = list(reader)
+        headers, rows = self.read_csv(self.output_combined_csv)
         
         # Check headers
         self.assertEqual(headers, ['timestamp', 'username', 'message'])
@@ -121,12 +117,7 @@ How do I get started with your SDK?""")
         self.assertEqual(len(rows), 5)
         
         # Check content of rows
-        usernames = [row[1] for row in rows]
-        self.assertIn('User1', usernames)
-        self.assertIn('User2', usernames)
-        self.assertIn('Support', usernames)
-        self.assertIn('User3', usernames)
-        self.assertIn('User4', usernames)
+        self.assertEqual({row[1] for row in rows}, {'User1', 'User2', 'Support', 'User3', 'User4'})
     
     def test_multiple_file_conversion_with_source(self):
         """Test converting multiple markdown files with source tracking."""
@@ -140,18 +131,50 @@ How do I get started with your SDK?""")
         self.assertEqual(record_count, 5)
         
         # Check CSV file content
-        with open(self.output_combined_csv, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            rows = list(reader)
+        headers, rows = self.read_csv(self.output_combined_csv)
         
         # Check headers include source
         self.assertEqual(headers, ['timestamp', 'username', 'message', 'source'])
         
         # Check sources
+        self.assertEqual({row[3] for row in rows}, {'test', 'test2'})
+    
+    def test_multiple_file_conversion_in_parallel(self):
+        """Test that files parsed in worker processes are merged chronologically."""
+        input_files = [self.test_md_file, self.test_md_file2]
+        for i in range(3):
+            extra_file = os.path.join(self.test_dir, f"extra{i}.md")
+            with open(extra_file, 'w', encoding='utf-8') as f:
+                f.write(f"Extra{i} — 1/{i + 1}/25 at 9:00 AM\nMessage {i}")
+            self.addCleanup(os.remove, extra_file)
+            input_files.append(extra_file)
+        
+        record_count = convert_multiple_markdown_files(input_files, self.output_combined_csv)
+        
+        # Check number of records
+        self.assertEqual(record_count, 8)
+        
+        # Check rows are in chronological order across files
+        _, rows = self.read_csv(self.output_combined_csv)
+        timestamps = [row[0] for row in rows]
+        self.assertEqual(timestamps, sorted(timestamps))
+    
+    def test_multiple_file_conversion_assume_sorted(self):
+        """Test that pre-sorted files are streamed to the CSV in input order."""
+        record_count = convert_multiple_markdown_files(
+            [self.test_md_file2, self.test_md_file], 
+            self.output_combined_csv,
+            track_source=True,
+            assume_sorted=True
+        )
+        
+        # Check number of records
+        self.assertEqual(record_count, 5)
+        
+        # Check rows keep the input file order
+        _, rows = self.read_csv(self.output_combined_csv)
         sources = [row[3] for row in rows]
-        self.assertIn('test', sources)
-        self.assertIn('test2', sources)
+        self.assertEqual(sources, ['test2', 'test2', 'test', 'test', 'test'])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
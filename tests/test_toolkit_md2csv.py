@@ -10,90 +10,90 @@ import unittest
 import tempfile
 import shutil
 import subprocess
+from contextlib import redirect_stdout
+from io import StringIO
 from pathlib import Path
+from unittest.mock import patch
+
+# toolkit.py imports its step scripts by module name, as it does when run from the scripts directory
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+import toolkit
+
+# Shared fixtures live next to this file
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+if TESTS_DIR not in sys.path:
+    sys.path.insert(0, TESTS_DIR)
+from md_fixtures import write_fixtures
 
 class TestToolkitMd2CsvCommand(unittest.TestCase):
     """Integration test cases for the md2csv command in toolkit.py."""
     
-    def setUp(self):
-        """Set up test environment."""
-        self.test_dir = tempfile.mkdtemp()
-        self.project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    @classmethod
+    def setUpClass(cls):
+        """Create the test directory and markdown files once for all tests."""
+        cls.test_dir = tempfile.mkdtemp()
+        cls.project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
         
         # Create test markdown files
-        self.test_md_file = os.path.join(self.test_dir, "test.md")
-        with open(self.test_md_file, 'w', encoding='utf-8') as f:
-            f.write("""User1 — 12/30/24, 11:16 AM
-Hi all! New here. Just exploring your product.
-
-
-User2 — 12/30/24, 11:50 AM
-Can I do this via the free plan?
-
-
-Support — 1/2/25, 10:32 AM
-@team-member1 Could you answer this? ^""")
-        
-        self.test_md_file2 = os.path.join(self.test_dir, "test2.md")
-        with open(self.test_md_file2, 'w', encoding='utf-8') as f:
-            f.write("""User3 — 1/5/25, 1:46 AM
-Hi, I have a question regarding your APIs.
-
-
-User4 — 1/6/25, 2:30 PM
-How do I get started with your SDK?""")
+        fixtures = write_fixtures(cls.test_dir)
+        cls.test_md_file = fixtures["test.md"]
+        cls.test_md_file2 = fixtures["test2.md"]
         
         # Output files
-        self.output_csv = os.path.join(self.test_dir, "output.csv")
-        self.output_combined_csv = os.path.join(self.test_dir, "combined.csv")
+        cls.output_csv = os.path.join(cls.test_dir, "output.csv")
+        cls.output_combined_csv = os.path.join(cls.test_dir, "combined.csv")
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up test environment."""
-        shutil.rmtree(self.test_dir)
+        shutil.rmtree(cls.test_dir)
+    
+    def tearDown(self):
+        """Remove this test's CSV outputs so each test starts without them."""
+        for output_file in (self.output_csv, self.output_combined_csv):
+            if os.path.exists(output_file):
+                os.remove(output_file)
+    
+    def read_csv(self, path):
+        """Read a CSV file, returning its header row and the remaining rows."""
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            headers = next(reader)
+            return headers, list(reader)
     
     def test_md2csv_single_file(self):
-        """Test the md2csv command with a single file."""
-        # Run the command
-        cmd = [
-            sys.executable, 
-            os.path.join(self.project_root, "scripts/toolkit.py"),
-            "md2csv",
-            "--input", self.test_md_file,
-            "--output", self.output_csv
-        ]
+        """Test the md2csv command with a single file, run in-process."""
+        # Run the command through the toolkit's entry point, which changes to the project root
+        self.addCleanup(os.chdir, os.getcwd())
+        argv = ["toolkit.py", "md2csv", "--input", self.test_md_file, "--output", self.output_csv]
+        output = StringIO()
+        with patch.object(sys, "argv", argv), redirect_stdout(output):
+            exit_code = toolkit.main()
+        self.assertEqual(exit_code, 0, output.getvalue())
         
-        try:
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-            
-            # Check CSV file exists
-            self.assertTrue(os.path.exists(self.output_csv))
-            
-            # Check CSV file content
-            with open(self.output_csv, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                headers = next(reader)
-                rows = list(reader)
-            
-            # Check headers
-            self.assertEqual(headers, ['timestamp', 'username', 'message'])
-            
-            # Check row count
-            self.assertEqual(len(rows), 3)
-            
-            # Check content of rows
-            usernames = [row[1] for row in rows]
-            self.assertIn('User1', usernames)
-            self.assertIn('User2', usernames)
-            self.assertIn('Support', usernames)
+        # Check CSV file exists
+        self.assertTrue(os.path.exists(self.output_csv))
         
-        except subprocess.CalledProcessError as e:
-            self.fail(f"Command failed with return code {e.returncode}: {e.stderr}")
+        # Check CSV file content
+        headers, rows = self.read_csv(self.output_csv)
+        
+        # Check headers
+        self.assertEqual(headers, ['timestamp', 'username', 'message'])
+        
+        # Check row count
+        self.assertEqual(len(rows), 3)
+        
+        # Check content of rows
+        self.assertEqual({row[1] for row in rows}, {'User1', 'User2', 'Support'})
     
     def test_md2csv_multiple_files(self):
-        """Test the md2csv command with multiple files."""
-        # Run the command
+        """Test the md2csv command with multiple files, run as a command line script."""
+        # Run the command; md2csv only needs the standard library, so skip site-packages setup with -S
         cmd = [
             sys.executable, 
+            "-S",
             os.path.join(self.project_root, "scripts/toolkit.py"),
             "md2csv",
             "--input", self.test_md_file, self.test_md_file2,
@@ -108,10 +108,7 @@ How do I get started with your SDK?""")
             self.assertTrue(os.path.exists(self.output_combined_csv))
             
             # Check CSV file content
-            with open(self.output_combined_csv, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                headers = next(reader)
-                rows = list(reader)
+            headers, rows = self.read_csv(self.output_combined_csv)
             
             # Check headers include source
             self.assertEqual(headers, ['timestamp', 'username', 'message', 'source'])
@@ -120,17 +117,10 @@ How do I get started with your SDK?""")
             self.assertEqual(len(rows), 5)
             
             # Check content of rows
-            usernames = [row[1] for row in rows]
-            self.assertIn('User1', usernames)
-            self.assertIn('User2', usernames)
-            self.assertIn('Support', usernames)
-            self.assertIn('User3', usernames)
-            self.assertIn('User4', usernames)
+            self.assertEqual({row[1] for row in rows}, {'User1', 'User2', 'Support', 'User3', 'User4'})
             
             # Check sources
-            sources = [row[3] for row in rows]
-            self.assertTrue(any('test' in s for s in sources))
-            self.assertTrue(any('test2' in s for s in sources))
+            self.assertEqual({row[3] for row in rows}, {'test', 'test2'})
         
         except subprocess.CalledProcessError as e:
             self.fail(f"Command failed with return code {e.returncode}: {e.stderr}")